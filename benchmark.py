@@ -0,0 +1,298 @@
+# Reproducible benchmarks of the engine's hot paths.
+#
+# Every run uses the same positions, drawn from seeded random games (opening, midgame and endgame
+# positions), and the same seeds for anything the players randomize. It measures:
+#   - micro-benchmarks of the board methods, the beam search and every heuristic, on both board backends
+#   - perft node counts from the start position
+#   - time and node counts of a fixed-depth search for each factory in player1.all_players
+# Results are written as JSON and compared with a stored baseline: node counts have to match exactly,
+# times may not exceed the baseline by more than the tolerance. Micro-benchmarks take microseconds and
+# wobble with whatever else the machine is doing, so each is run for a minimum time and gets a wider
+# tolerance, as does anything else that takes under a second. Any regression makes the run exit with
+# status 1.
+#
+#   python benchmark.py                   compare with benchmark_baseline.json
+#   python benchmark.py --save-baseline   record a new baseline (times only make sense on one machine)
+import argparse
+import json
+import random
+import sys
+import timeit
+from functools import partial
+from os import getcwd
+from time import perf_counter
+from reversi_board import ReversiBoard
+from reversi_bitboard import BitReversiBoard
+from reversi_generic_bitboard import GenericBitReversiBoard
+from perft import perft
+from player1 import all_players
+from player1.MiniMaxPlayer import MiniMaxComputerPlayer, simple_evaluate, difference_heuristic, mobility_heuristic, \
+    corner_heuristic, stability_heuristic, combined_heuristics
+from player1.transposition import TranspositionTable
+from player1.damionWork.BeamSearch import beam_search
+
+DEFAULT_BASELINE = getcwd() + '/benchmark_baseline.json'
+# Times may be this many times the baseline before they count as a regression.
+DEFAULT_TOLERANCE = 1.5
+# ... and micro-benchmark times this many times.
+DEFAULT_MICRO_TOLERANCE = 3.0
+# Every timed run of a micro-benchmark calls it often enough to take at least this many seconds.
+MICRO_MIN_TIME = 0.1
+# Other benchmarks whose baseline is shorter than this are as noisy, and get the micro tolerance too.
+SHORT_TIME = 1.0
+
+POSITION_SEED = 2024
+# (phase, plies played, how many positions)
+PHASES = [('opening', 8, 6), ('midgame', 30, 6), ('endgame', 48, 6)]
+PERFT_DEPTH = 6
+SEARCH_DEPTH = 3
+# Factories whose node counts depend on process scheduling; only their times are compared.
+NONDETERMINISTIC = {'get_parallel_player'}
+
+BACKENDS = [('list', ReversiBoard), ('bitboard', BitReversiBoard)]
+# Board sizes other than 8x8 timed with perft on the generic bitboard.
+GENERIC_SIZES = [6, 10, 16]
+
+
+def benchmark_positions(board_class=BitReversiBoard, seed=POSITION_SEED):
+    '''
+    Builds the fixed set of benchmark positions by playing seeded random games
+    :return: a list of (name, board, side to move)
+    '''
+    rng = random.Random(seed)
+    positions = []
+    for phase, plies, count in PHASES:
+        while sum(1 for name, _, _ in positions if name.startswith(phase)) < count:
+            board = board_class()
+            symbol = 'X'
+            for _ in range(plies):
+                moves = board.calc_valid_moves(symbol)
+                if moves:
+                    board.make_move(symbol, rng.choice(moves))
+                symbol = board.get_opponent_symbol(symbol)
+            # positions where the side to move has to pass or the game is over aren't useful
+            if board.calc_valid_moves(symbol):
+                positions.append((phase + str(sum(1 for name, _, _ in positions if name.startswith(phase))), board,
+                                  symbol))
+    return positions
+
+
+def _clear_caches(board):
+    # Drops the board's cached legal moves so calc_valid_moves has to generate them.
+    if hasattr(board, '_move_masks'):
+        board._move_masks = {}
+    else:
+        board._valid_moves = {}
+
+
+def _time(function, min_time):
+    # Best of five runs, in seconds per call, each run calling function often enough to take min_time.
+    timer = timeit.Timer(function)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(number=number, repeat=5)) / number
+
+
+def micro_benchmarks(min_time=MICRO_MIN_TIME):
+    results = {}
+    lookup = MiniMaxComputerPlayer.init_lookup(8)
+    hasher = MiniMaxComputerPlayer.__new__(MiniMaxComputerPlayer)
+    hasher.lookup = lookup
+    for backend, board_class in BACKENDS:
+        positions = benchmark_positions(board_class)
+        boards = [board for _, board, _ in positions]
+        symbols = [symbol for _, _, symbol in positions]
+        first_moves = [board.calc_valid_moves(symbol)[0] for _, board, symbol in positions]
+        for board in boards:
+            board.set_zobrist_keys(lookup)
+
+        def valid_moves():
+            for board, symbol in zip(boards, symbols):
+                _clear_caches(board)
+                board.calc_valid_moves(symbol)
+
+        def make_undo():
+            for board, symbol, move in zip(boards, symbols, first_moves):
+                board.undo_move(board.make_move(symbol, move))
+
+        def scores():
+            for board in boards:
+                board.calc_scores()
+
+        def full_hash():
+            for board in boards:
+                hasher.hash(board)
+
+        def canonical_hash():
+            for board in boards:
+                board.canonical_hash()
+
+        def beam():
+            for board, symbol in zip(boards, symbols):
+                beam_search(board, board.calc_valid_moves(symbol), symbol, 3)
+
+        cases = [('calc_valid_moves', valid_moves), ('make_move+undo_move', make_undo), ('calc_scores', scores),
+                 ('hash', full_hash), ('canonical_hash', canonical_hash), ('beam_search', beam)]
+        for function in heuristics():
+            def evaluate(function=function):
+                for board, symbol in zip(boards, symbols):
+                    _clear_caches(board)
+                    function(board, symbol)
+            cases.append((_name(function), evaluate))
+        for name, case in cases:
+            results['micro/' + backend + '/' + name] = {'time': _time(case, min_time) / len(boards)}
+    return results
+
+
+def heuristics():
+    functions = [simple_evaluate, difference_heuristic, mobility_heuristic, corner_heuristic, stability_heuristic,
+                 combined_heuristics, all_players.stable_combined_heuristics]
+    try:
+        all_players.pattern_heuristic(BitReversiBoard(), 'X')
+        functions.append(all_players.pattern_heuristic)
+    except OSError:
+        # no trained pattern weights here
+        pass
+    return functions
+
+
+def perft_benchmarks(depth=PERFT_DEPTH):
+    results = {}
+    for backend, board_class in BACKENDS:
+        start = perf_counter()
+        nodes = perft(board_class(), 'X', depth)
+        results['perft/' + backend + '/' + str(depth)] = {'time': perf_counter() - start, 'nodes': nodes}
+    for size in GENERIC_SIZES:
+        start = perf_counter()
+        nodes = perft(GenericBitReversiBoard(size), 'X', depth)
+        results['perft/generic%d/%d' % (size, depth)] = {'time': perf_counter() - start, 'nodes': nodes}
+    return results
+
+
+def search_benchmarks(depth=SEARCH_DEPTH):
+    results = {}
+    for name, factory in factories():
+        player = None
+        nodes = 0
+        elapsed = 0
+        for _, board, symbol in benchmark_positions():
+            if player is None or player.symbol != symbol:
+                if player is not None:
+                    player.close()
+                player = _fixed_depth_player(factory, symbol, depth)
+            # a fresh table and the same seed for every search, so nothing carries over between runs
+            player.trans_table = TranspositionTable()
+            random.seed(POSITION_SEED)
+            start = perf_counter()
+            stats = player.search(board.copy())
+            elapsed += perf_counter() - start
+            nodes += stats.nodes
+        player.close()
+        result = {'time': elapsed}
+        if name not in NONDETERMINISTIC:
+            result['nodes'] = nodes
+        results['search/' + name + '/' + str(depth)] = result
+    return results
+
+
+def factories():
+    # The all_players factories, with their standard arguments.
+    names = ['get_base_player', 'get_player_a', 'get_player_b', 'get_player_c', 'get_player_d', 'get_combined_player',
+             'get_timed_player', 'get_parallel_player', 'get_pvs_player']
+    if all_players.pattern_heuristic in heuristics():
+        names.append('get_pattern_player')
+    result = []
+    for name in names:
+        factory = getattr(all_players, name)
+        if name == 'get_parallel_player':
+            factory = partial(factory, workers=2)
+        result.append((name, factory))
+    return result
+
+
+def _fixed_depth_player(factory, symbol, depth):
+    # Builds the factory's player searching exactly depth plies, without the state it keeps across runs.
+    player = factory(symbol)
+    player.target = depth
+    player.time_limit = None
+    player.change_depth = False
+    player.opening_book = None
+    return player
+
+
+def run(quick=False):
+    results = micro_benchmarks(MICRO_MIN_TIME / 10 if quick else MICRO_MIN_TIME)
+    results.update(perft_benchmarks(PERFT_DEPTH - 1 if quick else PERFT_DEPTH))
+    results.update(search_benchmarks())
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, micro_tolerance=DEFAULT_MICRO_TOLERANCE):
+    '''
+    Checks results against a baseline
+    :param tolerance: how many times its baseline time a perft or search benchmark may take
+    :param micro_tolerance: the same for micro-benchmarks and anything shorter than SHORT_TIME
+    :return: a list of regression messages, empty when there are none
+    '''
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if 'nodes' in base and result.get('nodes') != base['nodes']:
+            regressions.append("%s: %s nodes, baseline %s" % (name, result.get('nodes'), base['nodes']))
+        limit = micro_tolerance if name.startswith('micro/') or base['time'] < SHORT_TIME else tolerance
+        if result['time'] > base['time'] * limit:
+            regressions.append("%s: %.3gs, baseline %.3gs (%.2fx)" % (name, result['time'], base['time'],
+                                                                       result['time'] / base['time']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the engine against a stored baseline.")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline file to compare with or save to")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--output', help="also write the results as JSON to this file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="how many times the baseline time counts as a regression")
+    parser.add_argument('--micro-tolerance', type=float, default=DEFAULT_MICRO_TOLERANCE,
+                        help="the same for micro-benchmarks and other very short ones")
+    parser.add_argument('--quick', action='store_true', help="fewer repetitions and a shallower perft")
+    args = parser.parse_args()
+
+    results = run(args.quick)
+    for name, result in sorted(results.items()):
+        print("%-60s %12.3g s" % (name, result['time']) + ("  %d nodes" % result['nodes'] if 'nodes' in result else ""))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+            f.write('\n')
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+            f.write('\n')
+        print("baseline written to", args.baseline)
+        return
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except OSError:
+        print("no baseline at", args.baseline + ", run with --save-baseline to record one")
+        return
+    regressions = compare(results, baseline, args.tolerance, args.micro_tolerance)
+    for regression in regressions:
+        print("REGRESSION", regression)
+    if regressions:
+        sys.exit(1)
+    print("no regressions against", args.baseline)
+
+
+def _name(function):
+    if isinstance(function, partial):
+        return function.func.__name__ + "(" + ", ".join(k + "=" + repr(v) for k, v in function.keywords.items()) + ")"
+    return function.__name__
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# Compact binary files of finished games, written as games end and read back as a stream.
+#
+# File layout, all little endian:
+#   header: magic b'RVGR', format version (uint16), board size (uint8), pad
+#   then one record per game: move count (uint16), final X score (uint8), final O score (uint8), and the
+#   moves, one byte each, encoded like simulator.GameRecord (x * size + y, PASS for a pass)
+# so an 8x8 game takes about 64 bytes. Records are only ever appended, a file can be written to by one
+# game after another and read while it grows; a record cut short by a crash is dropped by the reader,
+# and cut off by the next writer before it appends.
+# Boards up to 15x15 number their squares below the PASS byte. A 16x16 board doesn't fit, so its files
+# are format version 2: the move count, both scores and every move are uint16, a pass being WIDE_PASS.
+# The format follows from the board size in the header.
+#
+# read_records yields one GameRecord at a time and replay walks through a game's positions on a single
+# board, so millions of games can be scanned without holding more than one in memory.
+import struct
+import sys
+from array import array
+from simulator import GameRecord, WIDE_PASS, decode_move, is_wide
+from reversi_bitboard import BitReversiBoard
+from reversi_generic_bitboard import GenericBitReversiBoard
+
+MAGIC = b'RVGR'
+VERSION = 1
+WIDE_VERSION = 2
+HEADER = struct.Struct('<4sHBx')
+RECORD = struct.Struct('<HBB')
+WIDE_RECORD = struct.Struct('<HHH')
+
+
+class GameRecordWriter:
+
+    def __init__(self, path, size=8):
+        '''
+        Opens a game record file for appending, creating it if it doesn't exist
+        :param size: board size of the games, which has to match an existing file's
+        '''
+        if size * size >= WIDE_PASS:
+            raise ValueError("game records only hold boards with fewer than %d squares" % WIDE_PASS)
+        self.path = path
+        self.size = size
+        self._record = WIDE_RECORD if is_wide(size) else RECORD
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, WIDE_VERSION if is_wide(size) else VERSION, size))
+            self._file.flush()
+        else:
+            try:
+                if _read_header(path) != size:
+                    raise ValueError(path + " holds games on a different board size")
+                # a partial record left by a crash would swallow the games appended after it
+                end = _complete_length(path, size)
+                if end < self._file.tell():
+                    self._file.truncate(end)
+            except BaseException:
+                self._file.close()
+                raise
+
+    def write(self, record):
+        # Appends one GameRecord and flushes it, so readers never see a game before it's whole.
+        head = self._record.pack(len(record.moves), record.scores['X'], record.scores['O'])
+        if self._record is WIDE_RECORD:
+            moves = array('H', record.moves)
+            if sys.byteorder == 'big':
+                moves.byteswap()
+            self._file.write(head + moves.tobytes())
+        else:
+            self._file.write(head + bytes(record.moves))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_records(path, records, size=8):
+    # Appends every GameRecord of an iterable to the file at path.
+    with GameRecordWriter(path, size) as writer:
+        for record in records:
+            writer.write(record)
+
+
+def read_records(path):
+    '''
+    Streams the games of a game record file
+    :return: a generator of GameRecords, in the order they were written
+    '''
+    wide = is_wide(_read_header(path))
+    head_struct, move_size = (WIDE_RECORD, 2) if wide else (RECORD, 1)
+    with open(path, 'rb') as f:
+        f.seek(HEADER.size)
+        while True:
+            head = f.read(head_struct.size)
+            if len(head) < head_struct.size:
+                return
+            count, x_score, o_score = head_struct.unpack(head)
+            moves = f.read(count * move_size)
+            if len(moves) < count * move_size:
+                return
+            if wide:
+                moves = array('H', moves)
+                if sys.byteorder == 'big':
+                    moves.byteswap()
+            yield GameRecord(moves, {'X': x_score, 'O': o_score})
+
+
+def record_size(path):
+    # Returns the board size of the games in a game record file.
+    return _read_header(path)
+
+
+def replay(record, board_class=BitReversiBoard, size=8, plies=None):
+    '''
+    Walks through the positions of a game
+    :param record: a GameRecord
+    :param plies: how many moves to walk through, the whole game by default
+    :return: a generator of (board, side to move, move) before each move, the move being [x, y] or None
+    for a pass. The same board is yielded every time with the move made after the caller is done with it,
+    so copy it to keep a position.
+    '''
+    board = board_class(size)
+    to_move = 'X'
+    for move in record.moves[:plies]:
+        square = decode_move(move, size)
+        yield board, to_move, square
+        if square is not None:
+            board.make_move(to_move, square)
+        to_move = board.get_opponent_symbol(to_move)
+
+
+def positions(path, board_class=None, plies=None):
+    '''
+    Streams every position of every game in a game record file
+    :param board_class: the board to replay on, by default BitReversiBoard for 8x8 games and
+    GenericBitReversiBoard otherwise
+    :return: a generator of (record, board, side to move, move), see replay
+    '''
+    size = record_size(path)
+    if board_class is None:
+        board_class = BitReversiBoard if size == 8 else GenericBitReversiBoard
+    for record in read_records(path):
+        for board, to_move, move in replay(record, board_class, size, plies):
+            yield record, board, to_move, move
+
+
+def _complete_length(path, size):
+    # Returns the length of a game record file up to the end of its last complete record.
+    head_struct, move_size = (WIDE_RECORD, 2) if is_wide(size) else (RECORD, 1)
+    end = HEADER.size
+    with open(path, 'rb') as f:
+        length = f.seek(0, 2)
+        while end + head_struct.size <= length:
+            f.seek(end)
+            count = head_struct.unpack(f.read(head_struct.size))[0]
+            if end + head_struct.size + count * move_size > length:
+                break
+            end += head_struct.size + count * move_size
+    return end
+
+
+def _read_header(path):
+    # Checks the header of a game record file and returns its board size.
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(path + " is not a game record file")
+    magic, version, size = HEADER.unpack(header)
+    if magic != MAGIC or version != (WIDE_VERSION if is_wide(size) else VERSION):
+        raise ValueError(path + " is not a game record file")
+    return size
@@ -0,0 +1,380 @@
+# Serves games against the computer players to many clients at once.
+#
+# Clients connect over TCP or a Unix socket and talk line-delimited JSON, one object per line:
+#   client: {"type": "new_game", "opponent": "timed", "symbol": "X", "size": 8}
+#   server: {"type": "state", "board": [[" ", "X", ...], ...], "to_move": "X", "your_turn": true,
+#            "valid_moves": [[2, 3], ...], "scores": {"X": 2, "O": 2}, "last_move": null}
+#   client: {"type": "move", "move": [2, 3]}      or {"type": "quit"} to resign
+#   server: {"type": "game_over", "scores": {...}, "winner": "X", "reason": "finished"}
+# plus {"type": "error", "message": ...} for anything the server can't accept. After game_over the
+# client can start another game on the same connection. The server greets every connection with
+# {"type": "welcome", "opponents": [...], "move_timeout": ...}.
+#
+# Every game is a coroutine, so one process hosts hundreds of games. The computer players' searches run
+# on a bounded process pool, each worker keeping one player per opponent and side, so a search never
+# blocks the event loop. Players in the workers never ponder, the pool keeps every CPU busy already. A
+# client has move_timeout seconds to answer, or loses the game; a computer move that isn't back within
+# ai_timeout seconds (including time spent queued for a worker) is replaced by a random legal move, so a
+# busy pool slows no game down by more than that. Fixed depth searches are stopped at that point too, so
+# a slow one doesn't keep holding its worker.
+#
+#   python game_server.py --port 8765                 serve on TCP
+#   python game_server.py --unix /tmp/reversi.sock    serve on a Unix socket
+#   python game_server.py --stand-ins 200             load test with 200 local random clients
+import argparse
+import asyncio
+import json
+import random
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from os import cpu_count
+from os.path import exists
+from time import perf_counter, time
+from reversi_board import ReversiBoard
+from reversi_bitboard import BitReversiBoard
+from reversi_generic_bitboard import GenericBitReversiBoard
+from reversi_players import RandomComputerPlayer, GreedyComputerPlayer
+from player1 import all_players
+from player1.MiniMaxPlayer import MiniMaxComputerPlayer, SearchTimeout
+from player1.ponder import disable_pondering
+from player1.patterns import DEFAULT_PATH as DEFAULT_WEIGHTS_PATH
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# The parallel player is left out, it would start a pool of its own inside every worker.
+OPPONENTS = {
+    'random': RandomComputerPlayer,
+    'greedy': GreedyComputerPlayer,
+    'base': all_players.get_base_player,
+    'a': all_players.get_player_a,
+    'b': all_players.get_player_b,
+    'c': all_players.get_player_c,
+    'd': all_players.get_player_d,
+    'combined': all_players.get_combined_player,
+    'timed': all_players.get_timed_player,
+    'pvs': partial(all_players.get_pvs_player, time_limit=2.5),
+}
+if exists(DEFAULT_WEIGHTS_PATH):
+    OPPONENTS['pattern'] = partial(all_players.get_pattern_player, time_limit=2.5)
+SIZES = range(4, 17, 2)
+# The pattern weights are trained on 8x8 games, every other opponent plays any size.
+EIGHT_BY_EIGHT_ONLY = {'pattern'}
+
+# Players built inside a worker process, reused for every move that process searches.
+_worker_players = {}
+
+
+def _worker_move(opponent, symbol, board, deadline):
+    # Searches a move in a worker process. deadline is a time.time() value: a fixed depth search has no
+    # clock of its own, so it is stopped there and None returned, instead of keeping the worker busy
+    # with a move the server has already replaced.
+    player = _worker_players.get((opponent, symbol))
+    if player is None:
+        player = _worker_players[(opponent, symbol)] = OPPONENTS[opponent](symbol)
+    if not isinstance(player, MiniMaxComputerPlayer) or player.time_limit is not None:
+        return list(player.get_move(board))
+    remaining = deadline - time()
+    if remaining <= 0:
+        return None
+    player._deadline = perf_counter() + remaining
+    try:
+        return list(player.get_move(board))
+    except SearchTimeout:
+        return None
+    finally:
+        player._deadline = None
+
+
+class GameServer:
+
+    def __init__(self, workers=None, move_timeout=60.0, ai_timeout=10.0, max_games=1000):
+        '''
+        :param workers: processes searching computer moves, one per CPU by default
+        :param move_timeout: seconds a client has to send each move
+        :param ai_timeout: seconds a computer move may take before a random move is played instead
+        :param max_games: games in progress at once, further new_game requests are refused
+        '''
+        self.pool = ProcessPoolExecutor(max_workers=workers or cpu_count(), initializer=disable_pondering)
+        self.move_timeout = move_timeout
+        self.ai_timeout = ai_timeout
+        self.max_games = max_games
+        self.active_games = 0
+        self.finished_games = 0
+        self.ai_timeouts = 0
+
+    # the accept backlog is sized for max_games, so a burst of connections isn't dropped half open
+    async def serve_tcp(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        return await asyncio.start_server(self.handle_client, host, port, backlog=self.max_games)
+
+    async def serve_unix(self, path):
+        return await asyncio.start_unix_server(self.handle_client, path, backlog=self.max_games)
+
+    def close(self):
+        # queued searches are dropped, running ones are waited for
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    async def handle_client(self, reader, writer):
+        # Runs one connection: any number of games, one after the other.
+        try:
+            await _send(writer, {'type': 'welcome', 'opponents': sorted(OPPONENTS), 'sizes': list(SIZES),
+                                 'move_timeout': self.move_timeout})
+            while True:
+                message = await _receive(reader)
+                if message is None or message.get('type') == 'quit':
+                    break
+                if message.get('type') != 'new_game':
+                    await _send(writer, _error("expected new_game"))
+                    continue
+                problem = self.check_new_game(message)
+                if problem is not None:
+                    await _send(writer, _error(problem))
+                    continue
+                self.active_games += 1
+                try:
+                    finished = await self.play_game(reader, writer, message.get('opponent', 'timed'),
+                                                    message.get('symbol', 'X'), message.get('size', 8))
+                finally:
+                    self.active_games -= 1
+                    self.finished_games += 1
+                if not finished:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def check_new_game(self, message):
+        # Returns why a new_game request can't be played, or None.
+        opponent = message.get('opponent', 'timed')
+        if not isinstance(opponent, str) or opponent not in OPPONENTS:
+            return "unknown opponent, choose one of " + ", ".join(sorted(OPPONENTS))
+        if message.get('symbol', 'X') not in ('X', 'O'):
+            return "symbol must be X or O"
+        size = message.get('size', 8)
+        if not _is_int(size) or size not in SIZES:
+            return "size must be one of " + ", ".join(str(size) for size in SIZES)
+        if size != 8 and opponent in EIGHT_BY_EIGHT_ONLY:
+            return opponent + " only plays on 8x8 boards"
+        if self.active_games >= self.max_games:
+            return "server full, try again later"
+        return None
+
+    async def play_game(self, reader, writer, opponent, symbol, size):
+        '''
+        Plays one game between the client and a computer opponent
+        :param symbol: the client's side
+        :return: False when the connection was lost or timed out, True otherwise
+        '''
+        board = BitReversiBoard() if size == 8 else GenericBitReversiBoard(size)
+        computer = board.get_opponent_symbol(symbol)
+        to_move = 'X'
+        last_move = None
+        reason = 'finished'
+        while board.game_continues():
+            moves = board.calc_valid_moves(to_move)
+            if not moves:
+                last_move = None
+                to_move = board.get_opponent_symbol(to_move)
+                continue
+            if to_move == symbol:
+                await _send(writer, _state(board, to_move, True, moves, last_move))
+                move = await self.client_move(reader, writer, board, symbol)
+                if move is None:
+                    reason = 'resigned'
+                    break
+                if move is False:
+                    await _send(writer, _game_over(board, computer, 'timeout'))
+                    return False
+            else:
+                move = await self.computer_move(opponent, computer, board)
+            board.make_move(to_move, move)
+            last_move = move
+            to_move = board.get_opponent_symbol(to_move)
+        winner = computer if reason == 'resigned' else _winner(board)
+        await _send(writer, _game_over(board, winner, reason))
+        return True
+
+    async def client_move(self, reader, writer, board, symbol):
+        # Waits for a legal move from the client. Returns it, None when the client resigns, or False when
+        # the client ran out of time or went away.
+        deadline = asyncio.get_running_loop().time() + self.move_timeout
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            try:
+                message = await asyncio.wait_for(_receive(reader), max(remaining, 0))
+            except asyncio.TimeoutError:
+                return False
+            if message is None:
+                return False
+            if message.get('type') == 'quit':
+                return None
+            move = message.get('move')
+            if message.get('type') != 'move' or not _is_square(move, board.get_size()):
+                await _send(writer, _error("expected a move [x, y] or quit"))
+            elif not board.is_valid_move(symbol, move):
+                await _send(writer, _error("%r is not a legal move" % (move,)))
+            else:
+                return list(move)
+
+    async def computer_move(self, opponent, symbol, board):
+        # Searches on the pool, falling back to a random legal move when the search takes too long.
+        future = asyncio.get_running_loop().run_in_executor(self.pool, _worker_move, opponent, symbol, board.copy(),
+                                                            time() + self.ai_timeout)
+        try:
+            move = await asyncio.wait_for(future, self.ai_timeout)
+        except asyncio.TimeoutError:
+            move = None
+        if move is None:
+            self.ai_timeouts += 1
+            return random.choice(board.calc_valid_moves(symbol))
+        if not board.is_valid_move(symbol, move):
+            return random.choice(board.calc_valid_moves(symbol))
+        return move
+
+
+def _state(board, to_move, your_turn, moves, last_move):
+    size = board.get_size()
+    return {'type': 'state', 'board': [[board.get_symbol_for_position([x, y]) for y in range(size)]
+                                       for x in range(size)],
+            'to_move': to_move, 'your_turn': your_turn, 'valid_moves': [list(move) for move in moves],
+            'scores': board.calc_scores(), 'last_move': last_move}
+
+
+def _game_over(board, winner, reason):
+    return {'type': 'game_over', 'scores': board.calc_scores(), 'winner': winner, 'reason': reason}
+
+
+def _error(message):
+    return {'type': 'error', 'message': message}
+
+
+def _winner(board):
+    scores = board.calc_scores()
+    if scores['X'] == scores['O']:
+        return 'TIE'
+    return 'X' if scores['X'] > scores['O'] else 'O'
+
+
+def _is_int(value):
+    # JSON true and false load as bools, which are ints to isinstance but no board coordinate or size.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_square(move, size):
+    return isinstance(move, list) and len(move) == 2 and all(_is_int(i) and 0 <= i < size for i in move)
+
+
+async def _send(writer, message):
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+
+
+async def _receive(reader):
+    # Returns the next message, None when the connection is closed; a line that isn't a JSON object
+    # reads as an empty message, which every handler rejects, and so does a line over the stream's limit.
+    try:
+        line = await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        return {}
+    if not line:
+        return None
+    try:
+        message = json.loads(line)
+    except ValueError:
+        return {}
+    return message if isinstance(message, dict) else {}
+
+
+async def play_remote(player, opponent='random', size=8, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+    '''
+    A stand-in client: plays one game on a server with a local player object
+    :param player: anything with a symbol and get_move(board), e.g. a RandomComputerPlayer
+    :param path: a Unix socket path, used instead of host and port when given
+    :return: the game_over message and the seconds between sending each move and the server's reply
+    '''
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    latencies = []
+    try:
+        await _receive(reader)
+        await _send(writer, {'type': 'new_game', 'opponent': opponent, 'symbol': player.symbol, 'size': size})
+        sent = perf_counter()
+        while True:
+            message = await _receive(reader)
+            if message is None:
+                raise ConnectionError("server closed the connection")
+            if message.get('type') == 'error':
+                raise ValueError(message['message'])
+            if message.get('type') == 'game_over':
+                await _send(writer, {'type': 'quit'})
+                return message, latencies
+            latencies.append(perf_counter() - sent)
+            move = player.get_move(ReversiBoard.from_rows(message['board']))
+            await _send(writer, {'type': 'move', 'move': list(move)})
+            sent = perf_counter()
+    finally:
+        writer.close()
+
+
+async def _load_test(server_args, clients, opponent, size, path):
+    server = GameServer(**server_args)
+    if path is not None:
+        listener = await server.serve_unix(path)
+    else:
+        listener = await server.serve_tcp(DEFAULT_HOST, 0)
+    port = None if path is not None else listener.sockets[0].getsockname()[1]
+    start = perf_counter()
+    results = await asyncio.gather(*[play_remote(RandomComputerPlayer('XO'[i % 2]), opponent, size, port=port,
+                                                 path=path) for i in range(clients)])
+    elapsed = perf_counter() - start
+    listener.close()
+    server.close()
+    latencies = sorted(latency for _, game_latencies in results for latency in game_latencies)
+    print(clients, "games against", opponent, "in %.1fs," % elapsed, len(latencies), "moves,",
+          server.ai_timeouts, "computer moves timed out")
+    if latencies:
+        print("reply time: median %.3fs, 99th percentile %.3fs, max %.3fs"
+              % (latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], latencies[-1]))
+
+
+async def _serve(server, host, port, path):
+    listener = await (server.serve_unix(path) if path is not None else server.serve_tcp(host, port))
+    print("serving on", path if path is not None else "%s:%d" % (host, port))
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves Reversi games against the computer players.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help="serve on this Unix socket path instead of TCP")
+    parser.add_argument('--workers', type=int, help="processes for the computer players' searches")
+    parser.add_argument('--move-timeout', type=float, default=60.0, help="seconds a client has for a move")
+    parser.add_argument('--ai-timeout', type=float, default=10.0, help="seconds a computer move may take")
+    parser.add_argument('--max-games', type=int, default=1000, help="games in progress at once")
+    parser.add_argument('--stand-ins', type=int,
+                        help="instead of serving, play this many local random clients against a server")
+    parser.add_argument('--opponent', default='greedy', choices=sorted(OPPONENTS),
+                        help="opponent of the stand-in clients")
+    parser.add_argument('--size', type=int, default=8, help="board size of the stand-in clients' games")
+    args = parser.parse_args()
+
+    server_args = {'workers': args.workers, 'move_timeout': args.move_timeout, 'ai_timeout': args.ai_timeout,
+                   'max_games': args.max_games}
+    if args.stand_ins:
+        asyncio.run(_load_test(server_args, args.stand_ins, args.opponent, args.size, args.unix))
+        return
+    server = GameServer(**server_args)
+    try:
+        asyncio.run(_serve(server, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
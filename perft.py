@@ -0,0 +1,161 @@
+# Perft: counts the positions a given number of plies ahead, to test and time move generation.
+#
+# A pass counts as a ply when the side to move has no legal move but the game goes on, and a finished
+# game counts as one position however many plies are left. From the 8x8 start position the counts are
+# 4, 12, 56, 244, 1396, 8200, 55092, 390216 for depths 1 to 8.
+#
+# cross_check walks the same tree with a board class and with the reference move generator
+# (_checkValidMoves/_makeMove on a plain list of lists, from reversi_board.py) side by side, and stops
+# at the first position where they disagree on the legal moves, the discs or the scores.
+#
+#   python perft.py --depth 6                           perft with every board class
+#   python perft.py --size 6 --depth 8 --check          ... and cross-check them with the reference
+import argparse
+import sys
+from time import perf_counter
+from reversi_board import ReversiBoard, _getNewBoard, _checkValidMoves, _makeMove, _undoMove, _getScoreOfBoard
+from reversi_bitboard import BitReversiBoard
+from reversi_generic_bitboard import GenericBitReversiBoard
+
+BACKENDS = {'list': ReversiBoard, 'bitboard': BitReversiBoard, 'generic': GenericBitReversiBoard}
+
+
+def perft(board, symbol, depth):
+    '''
+    Counts the positions depth plies ahead of board
+    :param symbol: the side to move
+    :return: the number of positions, passes and finished games counted as described above
+    '''
+    if depth == 0:
+        return 1
+    moves = board.calc_valid_moves(symbol)
+    opponent = board.get_opponent_symbol(symbol)
+    if not moves:
+        if not board.calc_valid_moves(opponent):
+            return 1
+        return perft(board, opponent, depth - 1)
+    if depth == 1:
+        # the positions after each move don't need to be made to be counted
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        record = board.make_move(symbol, move)
+        nodes += perft(board, opponent, depth - 1)
+        board.undo_move(record)
+    return nodes
+
+
+def divide(board, symbol, depth):
+    # Returns the perft count below each legal move, to narrow down where two move generators differ.
+    opponent = board.get_opponent_symbol(symbol)
+    counts = {}
+    for move in board.calc_valid_moves(symbol):
+        record = board.make_move(symbol, move)
+        counts[tuple(move)] = perft(board, opponent, depth - 1)
+        board.undo_move(record)
+    return counts
+
+
+def timed_perft(board_class, size=8, depth=6):
+    # Runs perft from the start position and returns the count, the time taken and nodes per second.
+    board = board_class(size)
+    start = perf_counter()
+    nodes = perft(board, 'X', depth)
+    elapsed = perf_counter() - start
+    return nodes, elapsed, nodes / elapsed if elapsed > 0 else float('inf')
+
+
+def cross_check(board_class, size=8, depth=6):
+    '''
+    Compares a board class with the reference move generator over the whole perft tree
+    :param board_class: the board class to check, built as board_class(size)
+    :return: None when they agree everywhere, otherwise a description of the first difference
+    '''
+    return _cross_check(board_class(size), _getNewBoard(size), 'X', depth, [])
+
+
+def _cross_check(board, reference, symbol, depth, path):
+    problem = _compare(board, reference, path)
+    if problem is not None or depth == 0:
+        return problem
+    opponent = 'O' if symbol == 'X' else 'X'
+    moves = _checkValidMoves(reference, symbol)
+    if not moves:
+        if not _checkValidMoves(reference, opponent):
+            if board.game_continues():
+                return _describe(path, "game_continues() is True in a finished game")
+            return None
+        if not board.game_continues():
+            return _describe(path, "game_continues() is False with " + opponent + " to move")
+        return _cross_check(board, reference, opponent, depth - 1, path + ['pass'])
+    for move in moves:
+        flipped = _makeMove(reference, symbol, move[0], move[1])
+        record = board.make_move(symbol, move)
+        if record is False:
+            problem = _describe(path, "make_move(%r, %r) was refused" % (symbol, move))
+        else:
+            problem = _cross_check(board, reference, opponent, depth - 1, path + [move])
+            board.undo_move(record)
+        _undoMove(reference, symbol, move, flipped)
+        if problem is None:
+            problem = _compare(board, reference, path + [move, 'undo'])
+        if problem is not None:
+            return problem
+    return None
+
+
+def _compare(board, reference, path):
+    size = len(reference)
+    if board.get_size() != size:
+        return _describe(path, "get_size() is %d, not %d" % (board.get_size(), size))
+    for x in range(size):
+        for y in range(size):
+            if board.get_symbol_for_position([x, y]) != reference[x][y]:
+                return _describe(path, "square %d,%d holds %r instead of %r"
+                                 % (x, y, board.get_symbol_for_position([x, y]), reference[x][y]))
+    scores = _getScoreOfBoard(reference)
+    if board.calc_scores() != scores:
+        return _describe(path, "calc_scores() is %r, not %r" % (board.calc_scores(), scores))
+    for symbol in ('X', 'O'):
+        moves = sorted(list(move) for move in board.calc_valid_moves(symbol))
+        expected = _checkValidMoves(reference, symbol)
+        if moves != expected:
+            return _describe(path, "calc_valid_moves(%r) is %r, not %r" % (symbol, moves, expected))
+    return None
+
+
+def _describe(path, problem):
+    return "after " + (" ".join(str(step) for step in path) or "no moves") + ": " + problem
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Counts perft nodes and cross-checks move generators.")
+    parser.add_argument('--size', type=int, default=8, help="board size")
+    parser.add_argument('--depth', type=int, default=6, help="plies to search")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), action='append',
+                        help="board class to run, every one that supports the size by default")
+    parser.add_argument('--check', action='store_true', help="cross-check against the reference move generator")
+    args = parser.parse_args()
+
+    failed = False
+    for name in args.backend or sorted(BACKENDS):
+        board_class = BACKENDS[name]
+        try:
+            nodes, elapsed, nps = timed_perft(board_class, args.size, args.depth)
+        except ValueError as e:
+            print("%-10s skipped: %s" % (name, e))
+            continue
+        print("%-10s perft(%d) = %d in %.3fs, %.0f nodes/s" % (name, args.depth, nodes, elapsed, nps))
+        if args.check:
+            problem = cross_check(board_class, args.size, args.depth)
+            if problem is None:
+                print("%-10s matches the reference" % name)
+            else:
+                print("%-10s MISMATCH %s" % (name, problem))
+                failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,151 @@
-import copy
 import random
-from pickle import load, dump
 from os import getcwd
+from zlib import crc32
 from datetime import datetime
+from time import perf_counter, time
+from reversi_bitboard import BitReversiBoard
+from reversi_generic_bitboard import GenericBitReversiBoard
+from player1.endgame import EndgameSolver, EndgameTimeout
+from player1.search_stats import SearchStats, ProfiledBoard, write_trace
+from player1.stability import count_stable, count_stable_sized
+from player1.transposition import EXACT, LOWER_BOUND, UPPER_BOUND, TERMINAL_DEPTH, \
+    SIDE_TO_MOVE_KEY, flip_flag
+from player1.tt_store import MappedTranspositionTable, sized_zobrist_keys
+from symmetry import transform_move, inverse_transform_move
+
+
+# A symmetric player only canonicalizes positions with at most this many discs. Symmetric copies of a
+# position meet in the opening, later on working out the canonical hash costs more than it saves.
+SYMMETRY_DISCS = 20
+# A fixed depth player has no clock to give the endgame solver, so it gets this many nodes (a couple of
+# seconds, about what a depth 7 search costs) and falls back to the normal search when they run out.
+ENDGAME_NODES = 100000
+
+
+class SearchTimeout(Exception):
+    # Raised inside the search when a timed player runs out of time for the current move.
+    pass
 
 
 class MiniMaxComputerPlayer:
 
-    def __init__(self, symbol, target, evaluation_function, pruning, beam_width=3, beam_search=None, change=False):
+    def __init__(self, symbol, target, evaluation_function, pruning, beam_width=3, beam_search=None, change=False,
+                 time_limit=None, workers=1, move_ordering=None, endgame_empties=None, opening_book=None,
+                 symmetric=False, profile=False, trace=None, ponder=False):
         self.symbol = symbol
         self.target = target
         self.evaluation_function = evaluation_function
         self.ab_pruning = pruning
         self.move_pruning = beam_search
+        # a number of moves, or a function of (depth, empty squares) giving it, like BeamSearch.AdaptiveWidth
         self.beam_width = beam_width
         self.lookup = None
         self.trans_table = None
-        self.read_trans_table(getcwd() + '/player1/trans_table.pickle')
-        self.read_lookup(getcwd() + '/player1/lookup.pickle')
-        print(len(self.trans_table))
+        self.open_trans_table(getcwd() + '/player1/trans_table.bin', getcwd() + '/player1/lookup.pickle')
+        # with symmetric set, rotations and reflections of a position share one transposition table entry
+        self.symmetric = symmetric
+        settings = "%s %s %s" % (_function_name(evaluation_function), _function_name(beam_search), beam_width)
+        self.key_salt = crc32(settings.encode()) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF
         self.change_depth = change
+        # a MoveOrderer, or None to search moves in random order
+        self.move_ordering = move_ordering
+        # with endgame_empties set, positions with that many empty squares or fewer are solved exactly
+        self.endgame_empties = endgame_empties
+        self.endgame = EndgameSolver()
+        # an OpeningBook checked before searching
+        self.opening_book = opening_book
+        # with a time limit (in seconds) get_move deepens one ply at a time instead of searching to target
+        self.time_limit = time_limit
+        self._deadline = None
+        # statistics of the search in progress, and of the last move (see search_stats.py)
+        self.stats = SearchStats()
+        self.last_stats = None
+        # with profile set the search also measures where its time goes, with a trace path every move's
+        # statistics are appended to that file, labelled with trace_label (the symbol by default)
+        self.profile = profile
+        self.trace = trace
+        self.trace_label = None
+        # with more than one worker the root moves are searched in parallel on a process pool
+        self.parallel = None
+        if workers > 1:
+            from player1.parallel_search import RootSplitter
+            self.parallel = RootSplitter(self, workers)
+        # with ponder set the player searches the opponent's likely replies while the opponent thinks
+        # (see ponder.py); a parallel player's cores are busy enough already
+        self.ponderer = None
+        if ponder and self.parallel is None:
+            from player1.ponder import Ponderer
+            self.ponderer = Ponderer(self)
 
     def get_move(self, board):
+        return self.search(board).move
+
+    def search(self, board):
+        '''
+        Picks a move for the position and records how the search went
+        :param board: the board being played on
+        :return: a SearchStats holding the chosen move
+        '''
+        stats = self.stats = SearchStats()
+        start = perf_counter()
+        evaluation_function, move_pruning = self.evaluation_function, self.move_pruning
+        # a parallel player's search runs in its workers, there is nothing to profile here
+        if self.profile and self.parallel is None:
+            board = ProfiledBoard(board, stats)
+            self.evaluation_function = lambda b, symbol: stats.timed('evaluation_time', evaluation_function, b, symbol)
+            if move_pruning is not None:
+                self.move_pruning = lambda *args, **kwargs: stats.timed('move_generation_time', move_pruning, *args, **kwargs)
+        try:
+            stats.move = self.choose_move(board, start)
+        finally:
+            self.evaluation_function, self.move_pruning = evaluation_function, move_pruning
+        stats.elapsed = perf_counter() - start
+        self.last_stats = stats
+        if self.trace is not None:
+            record = stats.as_dict()
+            record['label'] = self.trace_label or self.symbol
+            record['symbol'] = self.symbol
+            write_trace(self.trace, record)
+        return stats
+
+    def choose_move(self, board, start):
+        # The move choice behind search: book, pondering, endgame solver or search, in that order.
+        board.set_zobrist_keys(self.zobrist_keys(board.get_size()))
+        pondered = self.take_ponder_result(board)
+        if self.opening_book is not None:
+            move = self.opening_book.lookup(board, self.symbol)
+            if move is not None and board.is_valid_move(self.symbol, move):
+                self.stats.source = 'book'
+                return move
+        if pondered is not None:
+            depth, move, exact = pondered
+            self.stats.pondered = depth
+            if exact or (self.time_limit is None and depth >= self.target):
+                self.stats.source = 'ponder'
+                self.stats.depth = depth
+                return move
+        if self.endgame_empties is not None:
+            move = self.solve_endgame(board, start)
+            if move is not None:
+                return move
         possible_moves = board.calc_valid_moves(self.symbol)
-        if self.move_pruning is not None:
-            possible_moves = self.move_pruning(board, possible_moves, self.symbol, beam_width=self.beam_width)
-        random.shuffle(possible_moves)
-        best_move = possible_moves[0]
-        best_score = float('-inf')
-        start = datetime.utcnow()
-        for move in possible_moves:
-            bc = copy.deepcopy(board)
-            bc.make_move(self.symbol, move)
-            score = self.minimax(bc, 1, False, float('-inf'), float('inf'))
+        possible_moves = self.prune_moves(board, possible_moves, self.symbol, 0)
+        if self.move_ordering is not None:
+            self.move_ordering.new_search(board.get_size())
+        possible_moves = self.order_moves(possible_moves, self.symbol, 0, None)
+        if pondered is not None:
+            # the pondering's best move goes first
+            for move in possible_moves:
+                if tuple(move) == tuple(pondered[1]):
+                    possible_moves.remove(move)
+                    possible_moves.insert(0, move)
+                    break
+        if self.time_limit is not None:
+            return self.iterative_deepening(board, possible_moves, start, pondered)
 
-            if score > best_score:
-                best_score = score
-                best_move = move
+        start = datetime.utcnow()
+        best_move, best_score = self.search_root(board, possible_moves)
+        self.stats.depth = self.target
         end = (datetime.utcnow() - start).total_seconds()
         if end > 2.6 and self.change_depth:
             print("Whoops, changing depth for ", self.symbol)
@@ -49,78 +158,241 @@ class MiniMaxComputerPlayer:
 
         return best_move
 
+    def search_root(self, board, possible_moves):
+        # Searches every root move to self.target and returns the best (move, score) pair.
+        if self.parallel is not None:
+            return self.search_root_parallel(board, possible_moves)
+        best_move = possible_moves[0]
+        best_score = float('-inf')
+        for move in possible_moves:
+            record = board.make_move(self.symbol, move)
+            score = self.minimax(board, 1, False, float('-inf'), float('inf'))
+            board.undo_move(record)
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+        return best_move, best_score
+
+    def search_root_parallel(self, board, possible_moves):
+        deadline = None
+        if self._deadline is not None:
+            deadline = time() + (self._deadline - perf_counter())
+        scores = self.parallel.search_children(board, possible_moves, deadline, self.stats)
+        if scores is None:
+            raise SearchTimeout()
+        best_move = possible_moves[0]
+        best_score = float('-inf')
+        opp = board.get_opponent_symbol(self.symbol)
+        for move, score in zip(possible_moves, scores):
+            # keep the workers' exact child scores, stored for the side to move in the child
+            record = board.make_move(self.symbol, move)
+            self.trans_table.store(self.position_key(board, opp)[0], self.target - 1, EXACT, -score, None)
+            board.undo_move(record)
+            if score > best_score:
+                best_score = score
+                best_move = move
+        return best_move, best_score
+
+    def close(self):
+        # Shuts down the worker processes of a parallel player, and any pondering.
+        if self.parallel is not None:
+            self.parallel.close()
+        self.stop_pondering()
+
+    def ponder(self, board):
+        # Called with the board once the player's move is on it; starts pondering if the player does.
+        if self.ponderer is not None:
+            self.ponderer.start(board)
+
+    def stop_pondering(self):
+        if self.ponderer is not None:
+            self.ponderer.stop()
+
+    def take_ponder_result(self, board):
+        # Stops pondering and returns its (depth, move, exact) for this position, None if it didn't get to it.
+        if self.ponderer is None:
+            return None
+        pondered = self.ponderer.stop().get(self.hash(board))
+        if pondered is None or not board.is_valid_move(self.symbol, pondered[1]):
+            return None
+        return pondered
+
+    def solve_endgame(self, board, start):
+        # Returns the perfect move when the position is close enough to the end to solve, otherwise None.
+        if board.get_size() != 8:
+            return None
+        scores = board.calc_scores()
+        if board.get_size() ** 2 - scores['X'] - scores['O'] > self.endgame_empties:
+            return None
+        if not hasattr(board, 'get_bitboards'):
+            board = BitReversiBoard.from_board(board)
+        x, o = board.get_bitboards()
+        own, opp = (x, o) if self.symbol == 'X' else (o, x)
+        # a timed player keeps half its time for the normal search in case the solver doesn't finish,
+        # a fixed depth one gives it a node budget
+        if self.time_limit is None:
+            deadline, max_nodes = None, ENDGAME_NODES
+        else:
+            deadline, max_nodes = start + self.time_limit / 2, None
+        nodes = self.endgame.nodes
+        try:
+            move, score = self.endgame.best_move(own, opp, deadline, max_nodes)
+        except EndgameTimeout:
+            return None
+        finally:
+            self.stats.nodes += self.endgame.nodes - nodes
+        self.stats.source = 'endgame'
+        self.stats.depth = board.get_size() ** 2 - scores['X'] - scores['O']
+        return move
+
+    def iterative_deepening(self, board, possible_moves, start=None, pondered=None):
+        '''
+        Searches one ply deeper at a time until the time limit runs out
+        :param board: the board being played on
+        :param possible_moves: the root moves to search, best guess first
+        :param start: perf_counter() value the move's time started at, now by default
+        :param pondered: optional (depth, move, exact) of a search pondering already finished, which is
+        continued from instead of starting at depth 1
+        :return: the best move of the deepest search that finished in time
+        '''
+        self._deadline = (perf_counter() if start is None else start) + self.time_limit
+        # a timeout leaves moves on the board mid-search, so search a copy
+        board = board.copy()
+        scores = board.calc_scores()
+        empties = board.get_size() ** 2 - scores['X'] - scores['O']
+        target = self.target
+        best_move = possible_moves[0]
+        depth = 1
+        if pondered is not None and tuple(pondered[1]) == tuple(best_move):
+            depth = pondered[0] + 1
+            self.stats.depth = pondered[0]
+        try:
+            while depth <= empties:
+                self.target = depth
+                best_move, best_score = self.search_root(board, possible_moves)
+                self.stats.depth = depth
+                # the next iteration looks at this iteration's best move first
+                possible_moves.remove(best_move)
+                possible_moves.insert(0, best_move)
+                depth += 1
+        except SearchTimeout:
+            pass
+        finally:
+            self.target = target
+            self._deadline = None
+        return best_move
+
     def minimax(self, board, depth, max_turn, alpha, beta):
         '''
         Starts the recursive minimax algorithm and acts as the first Max move
         :param board: the board being played on
         :return: the number pair that represents the best move that can be made, determined by the algorithm
         '''
+        if self._deadline is not None and perf_counter() > self._deadline:
+            raise SearchTimeout()
+        stats = self.stats
+        stats.nodes += 1
         opp = board.get_opponent_symbol(self.symbol)
-        if depth == self.target or not board.game_continues():
-            h = self.hash(board)
-            s = self.trans_table.get(h)
-            if s is not None:
-                return s
-            else:
-                s = self.evaluation_function(board, self.symbol)
-                self.trans_table[h] = s
-                return s
-
-        if self.move_pruning is not None:
-            possible_moves = self.move_pruning(board, board.calc_valid_moves(self.symbol),self.symbol, beam_width=self.beam_width) \
-                if max_turn else self.move_pruning(board, board.calc_valid_moves(opp), opp, beam_width=self.beam_width)
-        else:
-            possible_moves = board.calc_valid_moves(self.symbol) if max_turn else board.calc_valid_moves(opp)
-        random.shuffle(possible_moves)
-
+        to_move = self.symbol if max_turn else opp
+        key, t = self.position_key(board, to_move)
+        remaining = self.target - depth
+        stats.tt_probes += 1
+        entry = self.trans_table.probe(key)
+        if entry is not None:
+            stats.tt_hits += 1
+            if entry[0] >= remaining:
+                # entries are stored for the side to move, scores here are always for self.symbol
+                flag = entry[1] if max_turn else flip_flag(entry[1])
+                score = entry[2] if max_turn else -entry[2]
+                if flag == EXACT or (flag == LOWER_BOUND and score >= beta) or (flag == UPPER_BOUND and score <= alpha):
+                    stats.tt_cutoffs += 1
+                    return score
+
+        if not board.game_continues():
+            stats.leaves += 1
+            s = self.evaluation_function(board, self.symbol)
+            self.trans_table.store(key, TERMINAL_DEPTH, EXACT, s if max_turn else -s, None)
+            return s
+        if depth >= self.target:
+            stats.leaves += 1
+            s = self.evaluation_function(board, self.symbol)
+            self.trans_table.store(key, 0, EXACT, s if max_turn else -s, None)
+            return s
+
+        possible_moves = self.prune_moves(board, board.calc_valid_moves(to_move), to_move, depth)
+        if not possible_moves:
+            # to_move has to pass, the game goes on with the other side
+            return self.minimax(board, depth+1, not max_turn, alpha, beta)
+        possible_moves = self.order_moves(possible_moves, to_move, depth, self.table_move(entry, t, board))
+
+        alpha_start, beta_start = alpha, beta
         best_score = float('-inf') if max_turn else float('inf')
+        best_move = None
 
         for move in possible_moves:
-            bc = copy.deepcopy(board)
-            bc.make_move(self.symbol, move) if max_turn else bc.make_move(bc.get_opponent_symbol(self.symbol), move)
-
-            score = self.minimax(bc, depth+1, not max_turn, alpha, beta)
+            record = board.make_move(to_move, move)
+            score = self.minimax(board, depth+1, not max_turn, alpha, beta)
+            board.undo_move(record)
 
             if max_turn and score > best_score:
                 best_score = score
+                best_move = move
 
                 if self.ab_pruning:
                     alpha = max(alpha, best_score)
                     if beta <= alpha:
+                        if self.move_ordering is not None:
+                            self.move_ordering.record_cutoff(move, to_move, depth, remaining)
                         break
 
             if not max_turn and score < best_score:
                 best_score = score
+                best_move = move
 
                 if self.ab_pruning:
                     beta = min(beta, best_score)
                     if beta <= alpha:
+                        if self.move_ordering is not None:
+                            self.move_ordering.record_cutoff(move, to_move, depth, remaining)
                         break
 
+        if best_score <= alpha_start:
+            flag = UPPER_BOUND
+        elif best_score >= beta_start:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        if max_turn:
+            self.trans_table.store(key, remaining, flag, best_score, transform_move(t, best_move, board.get_size()))
+        else:
+            self.trans_table.store(key, remaining, flip_flag(flag), -best_score, transform_move(t, best_move, board.get_size()))
         return best_score
 
-    def order_moves(self, board, max_turn):
-        opp = board.get_opponent_symbol(self.symbol)
-        if self.move_pruning is not None:
-            possible_moves = self.move_pruning(board, board.calc_valid_moves(self.symbol), self.symbol) if max_turn else self.move_pruning(board, board.calc_valid_moves(opp), opp)
-        else:
-            possible_moves = board.calc_valid_moves(self.symbol) if max_turn else board.calc_valid_moves(opp)
-        move_scores = []
-        for move in possible_moves:
-            bc = copy.deepcopy(board)
-            bc.make_move(self.symbol, move) if max_turn else bc.make_move(opp, move)
-            h = self.hash(bc)
-            s = self.trans_table.get(h)
-            if s is not None:
-                score = s if max_turn else -s
-            else:
-                s = self.evaluation_function(bc, self.symbol)
-                self.trans_table[h] = s
-                score = s if max_turn else -s
-            move_scores.append({'move': move, 'score': score})
-
-        ordered = sorted(move_scores, key=lambda x: x['score'], reverse=True if max_turn else False)
-        return [x['move'] for x in ordered]
+    def prune_moves(self, board, possible_moves, to_move, depth):
+        # Applies the beam search, if any, to the moves of a node depth plies below the root.
+        if self.move_pruning is None:
+            return possible_moves
+        width = self.beam_width
+        if callable(width):
+            scores = board.calc_scores()
+            width = width(depth, board.get_size() ** 2 - scores['X'] - scores['O'])
+        kept = self.move_pruning(board, possible_moves, to_move, beam_width=width)
+        self.stats.beam_calls += 1
+        self.stats.beam_pruned += len(possible_moves) - len(kept)
+        return kept
+
+    def order_moves(self, possible_moves, to_move, ply, tt_move):
+        # Returns the moves in the order to search them, tt_move being the best move stored for the position.
+        if self.move_ordering is not None:
+            return self.move_ordering.order(possible_moves, to_move, ply, tt_move)
+        random.shuffle(possible_moves)
+        if tt_move is not None:
+            for i in range(len(possible_moves)):
+                if tuple(possible_moves[i]) == tt_move:
+                    possible_moves[0], possible_moves[i] = possible_moves[i], possible_moves[0]
+                    break
+        return possible_moves
 
     @staticmethod
     def random_bitstring(length):
@@ -135,38 +407,55 @@ class MiniMaxComputerPlayer:
                     table[(x, y, s)] = MiniMaxComputerPlayer.random_bitstring(64)
         return table
 
+    def zobrist_keys(self, size):
+        # The Zobrist keys for boards of a size: the transposition table file's own for the size it was made
+        # for, fixed seeded ones (see tt_store.sized_zobrist_keys) for any other.
+        if len(self.lookup) == 2 * size * size:
+            return self.lookup
+        return sized_zobrist_keys(size)
+
     def hash(self, board):
         size = board.get_size()
+        lookup = self.zobrist_keys(size)
         h = 0
         for x in range(size):
             for y in range(size):
                 symbol = board.get_symbol_for_position([x, y])
                 if symbol != ' ':
-                    s = symbol == 'x'
-                    h ^= self.lookup[(x, y, s)]
+                    s = symbol == 'X'
+                    h ^= lookup[(x, y, s)]
         return h
 
-    def read_trans_table(self, path):
-        try:
-            with open(path, 'rb') as f:
-                self.trans_table = load(f)
-        except OSError:
-            print("No such file or directory")
-            self.trans_table = {}
+    def position_key(self, board, to_move):
+        '''
+        Transposition table key: the board's incrementally updated Zobrist hash plus the side to move, salted
+        with the search settings so players sharing a table file only share compatible scores. A symmetric
+        player uses the board's canonical hash in the opening instead, the same for every rotation and reflection.
+        :return: the key and the symmetry moves are stored under, 0 unless the key is a canonical one
+        '''
+        if self.symmetric and sum(board.calc_scores().values()) <= SYMMETRY_DISCS:
+            key, t = board.canonical_hash()
+        else:
+            key, t = board.get_hash(), 0
+        if to_move == 'O':
+            key ^= SIDE_TO_MOVE_KEY
+        return key ^ self.key_salt, t
 
-    def read_lookup(self, path):
-        try:
-            with open(path, 'rb') as f:
-                self.lookup = load(f)
-        except OSError:
-            print("No such file or directory")
-            self.lookup = self.init_lookup(8)
+    @staticmethod
+    def table_move(entry, t, board):
+        # Returns the best move of a transposition table entry mapped back onto board, or None.
+        if entry is None or entry[3] is None:
+            return None
+        return inverse_transform_move(t, entry[3], board.get_size())
+
+    def open_trans_table(self, path, lookup_path):
+        # Maps the transposition table file, creating it with the keys from lookup_path if it doesn't exist yet.
+        self.trans_table = MappedTranspositionTable(path, lookup_path=lookup_path)
+        self.lookup = self.trans_table.zobrist_keys()
 
-    def write_tras_lookup(self, trans_path, lookup_path):
-        with open(trans_path, 'wb') as f:
-            dump(self.trans_table, f)
-        with open(lookup_path, 'wb') as f:
-            dump(self.lookup, f)
+    def flush_trans_table(self):
+        if isinstance(self.trans_table, MappedTranspositionTable):
+            self.trans_table.flush()
 
 
 def simple_evaluate(board, symbol):
@@ -222,6 +511,41 @@ def corner_heuristic(board, symbol):
         return 0
 
 
-def combined_heuristics(board, symbol):
+def stability_heuristic(board, symbol):
+    # Compares the discs each side has that can never be flipped again (see stability.py).
+    size = board.get_size()
+    if size == 8:
+        if not hasattr(board, 'get_bitboards'):
+            board = BitReversiBoard.from_board(board)
+        x, o = board.get_bitboards()
+        own, opp = (x, o) if symbol == 'X' else (o, x)
+        self_stable, opponent_stable = count_stable(own, opp)
+    else:
+        # no edge tables for other sizes, see stability.py
+        if not hasattr(board, 'get_sized_bitboards'):
+            board = GenericBitReversiBoard.from_board(board)
+        x, o = board.get_sized_bitboards()
+        own, opp = (x, o) if symbol == 'X' else (o, x)
+        self_stable, opponent_stable = count_stable_sized(own, opp, size)
+
+    if self_stable + opponent_stable != 0:
+        percent_stable = 100 * ((self_stable - opponent_stable) / (self_stable + opponent_stable))
+        return percent_stable
+    else:
+        return 0
+
+
+def combined_heuristics(board, symbol, stability=False):
     overall_heuristic = difference_heuristic(board, symbol) + mobility_heuristic(board, symbol) + corner_heuristic(board, symbol)
+    if stability:
+        overall_heuristic += stability_heuristic(board, symbol)
     return overall_heuristic
+
+
+def _function_name(function):
+    # A name for a function (or partial of one) that is the same in every process.
+    if function is None:
+        return 'None'
+    if hasattr(function, 'func'):
+        return _function_name(function.func) + repr(function.args) + repr(sorted(function.keywords.items()))
+    return function.__module__ + '.' + function.__qualname__
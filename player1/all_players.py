@@ -1,5 +1,16 @@
+from functools import partial
+from os import cpu_count
 from player1.MiniMaxPlayer import MiniMaxComputerPlayer, simple_evaluate, difference_heuristic, combined_heuristics
 from player1.damionWork.BeamSearch import beam_search
+from player1.move_ordering import MoveOrderer
+from player1.negamax import NegamaxComputerPlayer
+from player1.opening_book import OpeningBook
+from player1.patterns import pattern_heuristic
+
+# The enhanced players solve the game exactly from this many empty squares on.
+ENDGAME_EMPTIES = 12
+# The enhanced players' evaluation: the combined heuristics plus disc stability.
+stable_combined_heuristics = partial(combined_heuristics, stability=True)
 
 
 def get_base_player(symbol, depth=4):
@@ -50,4 +61,33 @@ def get_combined_player(symbol, depth=7, width=3, change=False):
     """
     :returns: the best combination of the minimax enhancements that your team can create
     """
-    return MiniMaxComputerPlayer(symbol, depth, combined_heuristics, pruning=True, beam_search=beam_search, beam_width=width, change=change)
+    return MiniMaxComputerPlayer(symbol, depth, stable_combined_heuristics, pruning=True, beam_search=beam_search, beam_width=width, change=change, move_ordering=MoveOrderer(), endgame_empties=ENDGAME_EMPTIES, opening_book=OpeningBook(), symmetric=True)
+
+
+def get_timed_player(symbol, time_limit=2.5, width=3, ponder=False):
+    """
+    :returns: the combined player, searching as deep as it can within time_limit seconds per move, and on the
+    opponent's time too with ponder set
+    """
+    return MiniMaxComputerPlayer(symbol, 1, stable_combined_heuristics, pruning=True, beam_search=beam_search, beam_width=width, time_limit=time_limit, move_ordering=MoveOrderer(), endgame_empties=ENDGAME_EMPTIES, opening_book=OpeningBook(), symmetric=True, ponder=ponder)
+
+
+def get_parallel_player(symbol, depth=9, width=3, workers=None):
+    """
+    :returns: the combined player with its root moves searched in parallel, one process per core by default
+    """
+    return MiniMaxComputerPlayer(symbol, depth, stable_combined_heuristics, pruning=True, beam_search=beam_search, beam_width=width, workers=workers or cpu_count(), move_ordering=MoveOrderer(), endgame_empties=ENDGAME_EMPTIES, opening_book=OpeningBook(), symmetric=True)
+
+
+def get_pvs_player(symbol, depth=7, width=3, time_limit=None, ponder=False):
+    """
+    :returns: the combined player searching with negamax, principal variation search and aspiration windows
+    """
+    return NegamaxComputerPlayer(symbol, depth, stable_combined_heuristics, pruning=True, beam_search=beam_search, beam_width=width, time_limit=time_limit, move_ordering=MoveOrderer(), endgame_empties=ENDGAME_EMPTIES, opening_book=OpeningBook(), symmetric=True, ponder=ponder)
+
+
+def get_pattern_player(symbol, depth=7, width=3, time_limit=None):
+    """
+    :returns: the combined player evaluating with the trained pattern tables (python -m player1.pattern_train)
+    """
+    return MiniMaxComputerPlayer(symbol, depth, pattern_heuristic, pruning=True, beam_search=beam_search, beam_width=width, time_limit=time_limit, move_ordering=MoveOrderer(), endgame_empties=ENDGAME_EMPTIES, opening_book=OpeningBook(), symmetric=True)
@@ -0,0 +1,124 @@
+# NumPy versions of the evaluation functions that score a whole batch of positions in one call.
+#
+# A batch of positions is an (N, 2) uint64 array of (X, O) bitboards laid out like BitReversiBoard
+# (square (x, y) is bit x * 8 + y). Every function returns an (N,) float64 array holding the same
+# values the scalar function gives for each position, e.g. combined_scores matches combined_heuristics
+# and weighted_square_scores matches BeamSearch._heuristic_score.
+#
+# Needs numpy, which the rest of the engine does not.
+import numpy as np
+from reversi_bitboard import BitReversiBoard, DIRECTIONS, FULL, SIZE, calc_flips
+from player1.damionWork.BeamSearch import _valued_corners_edges
+
+_CORNERS = np.uint64((1 << 0) | (1 << (SIZE - 1)) | (1 << (SIZE * (SIZE - 1))) | (1 << (SIZE * SIZE - 1)))
+_DIRECTIONS = [(np.uint64(abs(shift)), shift > 0, np.uint64(mask)) for shift, mask in DIRECTIONS]
+_FULL = np.uint64(FULL)
+
+
+def positions_from_boards(boards):
+    # Builds a batch from board objects of either backend.
+    positions = np.empty((len(boards), 2), dtype=np.uint64)
+    for i, board in enumerate(boards):
+        if not hasattr(board, 'get_bitboards'):
+            board = BitReversiBoard.from_board(board)
+        positions[i] = board.get_bitboards()
+    return positions
+
+
+def child_positions(board, symbol):
+    '''
+    Builds the batch of positions reachable by one move of symbol
+    :param board: the board being played on
+    :param symbol: the side to move
+    :return: the list of moves and the batch of positions they lead to, in the same order
+    '''
+    if not hasattr(board, 'get_bitboards'):
+        board = BitReversiBoard.from_board(board)
+    x, o = board.get_bitboards()
+    own, opp = (x, o) if symbol == 'X' else (o, x)
+    moves = board.calc_valid_moves(symbol)
+    positions = np.empty((len(moves), 2), dtype=np.uint64)
+    for i, move in enumerate(moves):
+        bit = 1 << (move[0] * SIZE + move[1])
+        flips = calc_flips(own, opp, bit)
+        child_own, child_opp = own | bit | flips, opp ^ flips
+        positions[i] = (child_own, child_opp) if symbol == 'X' else (child_opp, child_own)
+    return moves, positions
+
+
+def difference_scores(positions, symbol):
+    own, opp = _counts(positions, symbol)
+    return 100 * ((own - opp) / (own + opp))
+
+
+def mobility_scores(positions, symbol):
+    own, opp = _split(positions, symbol)
+    own_moves = popcount(move_masks(own, opp)).astype(np.int64)
+    opp_moves = popcount(move_masks(opp, own)).astype(np.int64)
+    total = own_moves + opp_moves
+    # positions where neither side can move score 0, like mobility_heuristic
+    scores = np.zeros(len(positions), dtype=np.float64)
+    alive = total != 0
+    scores[alive] = 100 * ((own_moves[alive] - opp_moves[alive]) / total[alive])
+    return scores
+
+
+def corner_scores(positions, symbol):
+    own, opp = _split(positions, symbol)
+    own_corners = popcount(own & _CORNERS).astype(np.int64)
+    opp_corners = popcount(opp & _CORNERS).astype(np.int64)
+    total = own_corners + opp_corners
+    scores = np.zeros(len(positions), dtype=np.float64)
+    taken = total != 0
+    scores[taken] = 100 * ((own_corners[taken] - opp_corners[taken]) / total[taken])
+    return scores
+
+
+def weighted_square_scores(positions, symbol, weights=None):
+    # Sums the weight of every square symbol owns, the beam search's square table by default.
+    if weights is None:
+        weights = _valued_corners_edges()
+    weights = np.asarray(weights, dtype=np.int64).reshape(SIZE * SIZE)
+    own, _ = _split(positions, symbol)
+    return (unpack_squares(own) @ weights).astype(np.float64)
+
+
+def combined_scores(positions, symbol):
+    return difference_scores(positions, symbol) + mobility_scores(positions, symbol) + corner_scores(positions, symbol)
+
+
+def move_masks(own, opp):
+    # Vectorized calc_move_mask: the legal move bitboard of every position.
+    empty = ~(own | opp) & _FULL
+    moves = np.zeros_like(own)
+    for shift, left, mask in _DIRECTIONS:
+        step = np.left_shift if left else np.right_shift
+        t = step(own, shift) & mask & opp
+        for _ in range(SIZE - 3):
+            t |= step(t, shift) & mask & opp
+        moves |= step(t, shift) & mask & empty
+    return moves
+
+
+def popcount(bits):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bits)
+    return unpack_squares(bits).sum(axis=1)
+
+
+def unpack_squares(bits):
+    # (N,) uint64 bitboards to an (N, 64) array of 0/1, column i holding square i.
+    as_bytes = np.ascontiguousarray(bits, dtype='<u8').view(np.uint8).reshape(len(bits), 8)
+    return np.unpackbits(as_bytes, axis=1, bitorder='little')
+
+
+def _split(positions, symbol):
+    # Returns the (own, opponent) bitboard columns for symbol.
+    if symbol == 'X':
+        return positions[:, 0], positions[:, 1]
+    return positions[:, 1], positions[:, 0]
+
+
+def _counts(positions, symbol):
+    own, opp = _split(positions, symbol)
+    return popcount(own).astype(np.int64), popcount(opp).astype(np.int64)
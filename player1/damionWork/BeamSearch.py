@@ -1,21 +1,89 @@
-import copy
+# Beam search: keeps only the beam_width most promising moves of a node.
+#
+# A move is rated by the square table below, summed over the discs of the side to move after the move.
+# The discs owned before the move are the same for every move, so only the change matters: the weight of
+# the square played plus the weights of the discs it flips. That is computed from the flips alone,
+# without making the move, and the best moves are picked with one top-k selection.
+from heapq import nlargest
+from reversi_bitboard import calc_flips
 
 
 def beam_search(board, move_list, symbol, beam_width):
-    value_dictionary = {}
-    for move in move_list:
-        tempboard = copy.deepcopy(board)
-        tempboard.make_move(symbol, move)
-        value_dictionary[tuple(move)] = _heuristic_score(tempboard, symbol, _valued_corners_edges())
-    modified_move_list = []
-    for i in range(beam_width):
-        if len(value_dictionary) == 0:
-            break
-        max_value = max(value_dictionary.values())
-        max_keys = [k for k, v in value_dictionary.items() if v == max_value]
-        modified_move_list.append(max_keys[0])
-        value_dictionary.pop(max_keys[0])
-    return modified_move_list
+    '''
+    Picks the moves to search further
+    :param move_list: the legal moves of symbol
+    :param beam_width: how many moves to keep
+    :return: the beam_width best moves as (x, y) tuples, best first; ties keep the order of move_list
+    '''
+    weights = square_weights(board.get_size())
+    if hasattr(board, 'get_bitboards'):
+        x, o = board.get_bitboards()
+        own, opp = (x, o) if symbol == 'X' else (o, x)
+        size = board.get_size()
+        deltas = []
+        for move in move_list:
+            index = move[0] * size + move[1]
+            flips = calc_flips(own, opp, 1 << index)
+            delta = weights[index]
+            while flips:
+                low = flips & -flips
+                delta += weights[low.bit_length() - 1]
+                flips ^= low
+            deltas.append(delta)
+    else:
+        size = board.get_size()
+        deltas = []
+        for move in move_list:
+            delta = weights[move[0] * size + move[1]]
+            for fx, fy in board.is_valid_move(symbol, move):
+                delta += weights[fx * size + fy]
+            deltas.append(delta)
+    best = nlargest(beam_width, range(len(move_list)), key=deltas.__getitem__)
+    return [tuple(move_list[i]) for i in best]
+
+
+class AdaptiveWidth:
+    # A beam width that depends on where the node is: wider near the root, where a pruned move loses the
+    # most, and in the endgame, where the square table says little and there are few moves left anyway.
+    # MiniMaxComputerPlayer accepts one as its beam_width.
+
+    def __init__(self, width=3, root_plies=2, root_extra=2, endgame_empties=16, endgame_extra=2):
+        self.width = width
+        self.root_plies = root_plies
+        self.root_extra = root_extra
+        self.endgame_empties = endgame_empties
+        self.endgame_extra = endgame_extra
+
+    def __call__(self, depth, empties):
+        # Returns the width for a node depth plies below the root with empties empty squares.
+        width = self.width
+        if depth < self.root_plies:
+            width += self.root_extra
+        if empties <= self.endgame_empties:
+            width += self.endgame_extra
+        return max(1, width)
+
+    def __repr__(self):
+        # the settings, so the transposition table salt stays the same between runs
+        return "AdaptiveWidth(%d, %d, %d, %d, %d)" % (self.width, self.root_plies, self.root_extra,
+                                                      self.endgame_empties, self.endgame_extra)
+
+
+_square_weights = {}
+
+
+def square_weights(size):
+    # The square table flattened to index x * size + y: corners 100, other edge squares 25, the rest 1.
+    weights = _square_weights.get(size)
+    if weights is None:
+        weights = []
+        for x in range(size):
+            for y in range(size):
+                on_edge_x = x in (0, size - 1)
+                on_edge_y = y in (0, size - 1)
+                weights.append(100 if on_edge_x and on_edge_y else 25 if on_edge_x or on_edge_y else 1)
+        _square_weights[size] = weights
+    return weights
 
 
 def _heuristic_score(board, symbol, heuristic_function):
@@ -27,25 +95,25 @@ def _heuristic_score(board, symbol, heuristic_function):
     return score
 
 
-def _valued_corners_edges():
-    compareBoard = [[100, 25, 25, 25, 25, 25, 25, 100],
-                    [25, 1, 1, 1, 1, 1, 1, 25],
-                    [25, 1, 1, 1, 1, 1, 1, 25],
-                    [25, 1, 1, 1, 1, 1, 1, 25],
-                    [25, 1, 1, 1, 1, 1, 1, 25],
-                    [25, 1, 1, 1, 1, 1, 1, 25],
-                    [25, 1, 1, 1, 1, 1, 1, 25],
-                    [100, 25, 25, 25, 25, 25, 25, 100]]
-    return compareBoard
+def _valued_corners_edges(size=8):
+    # square_weights as a [x][y] table.
+    weights = square_weights(size)
+    return [weights[x * size:(x + 1) * size] for x in range(size)]
 
 
-def _gradually_valued_corners_edges():
-    compareBoard = [[100, 25, 25, 25, 25, 25, 25, 100],
-                    [25, 10, 10, 10, 10, 10, 10, 25],
-                    [25, 10, 5, 5, 5, 5, 10, 25],
-                    [25, 10, 5, 1, 1, 5, 10, 25],
-                    [25, 10, 5, 1, 1, 5, 10, 25],
-                    [25, 10, 5, 5, 5, 5, 10, 25],
-                    [25, 10, 10, 10, 10, 10, 10, 25],
-                    [100, 25, 25, 25, 25, 25, 25, 100]]
+def _gradually_valued_corners_edges(size=8):
+    # Like _valued_corners_edges, but the inner rings fall off gradually: 10, then 5, then 1 for the rest.
+    ring_weights = [None, 10, 5]
+    compareBoard = []
+    for x in range(size):
+        row = []
+        for y in range(size):
+            ring = min(x, y, size - 1 - x, size - 1 - y)
+            if ring == 0:
+                on_edge_x = x in (0, size - 1)
+                on_edge_y = y in (0, size - 1)
+                row.append(100 if on_edge_x and on_edge_y else 25)
+            else:
+                row.append(ring_weights[ring] if ring < len(ring_weights) else 1)
+        compareBoard.append(row)
     return compareBoard
@@ -0,0 +1,144 @@
+# Exact endgame solver.
+#
+# Once few enough squares are left the game can be searched to the end, giving the final disc
+# difference instead of a heuristic guess. The solver works directly on (own, opponent) bitboards
+# from reversi_bitboard: making a move is a couple of integer operations and there is nothing to undo.
+#
+# Moves are tried fastest first (fewest replies for the opponent) while many squares are empty, and by
+# parity below that: moves into a quadrant with an odd number of empty squares come first, since the
+# side that plays last in a region usually keeps it.
+from time import perf_counter
+from reversi_bitboard import FULL, SIZE, calc_flips, calc_move_mask, popcount
+
+# Above this many empty squares moves are sorted by opponent mobility, below it parity is cheaper.
+FASTEST_FIRST_EMPTIES = 7
+# Positions with at least this many empty squares have their bounds remembered.
+BOUNDS_EMPTIES = 8
+# Worse than any final disc difference.
+WORST = SIZE * SIZE + 1
+
+QUADRANTS = []
+for _qx in (0, SIZE // 2):
+    for _qy in (0, SIZE // 2):
+        _mask = 0
+        for _x in range(_qx, _qx + SIZE // 2):
+            for _y in range(_qy, _qy + SIZE // 2):
+                _mask |= 1 << (_x * SIZE + _y)
+        QUADRANTS.append(_mask)
+
+
+class EndgameTimeout(Exception):
+    pass
+
+
+class EndgameSolver:
+
+    def __init__(self):
+        self.nodes = 0
+        self._deadline = None
+        self._node_limit = None
+        # (own, opp) -> (lower, upper) bounds on the result, for positions with enough empties to be worth it
+        self._bounds = {}
+
+    def best_move(self, own, opp, deadline=None, max_nodes=None):
+        '''
+        Solves the position to the end of the game
+        :param own: bitboard of the side to move
+        :param opp: bitboard of the other side
+        :param deadline: optional perf_counter() value, EndgameTimeout is raised when it passes
+        :param max_nodes: optional node budget, EndgameTimeout is raised when it runs out
+        :return: the best move as [x, y] and the final disc difference it leads to with perfect play
+        '''
+        self._deadline = deadline
+        self._node_limit = None if max_nodes is None else self.nodes + max_nodes
+        self._bounds = {}
+        try:
+            best_bit = None
+            best_score = -WORST
+            for bit, flips in self._ordered_moves(own, opp, calc_move_mask(own, opp)):
+                child_own, child_opp = opp ^ flips, own | bit | flips
+                if best_bit is None:
+                    score = -self.solve(child_own, child_opp, -WORST, WORST)
+                else:
+                    # only a better move is interesting: test with a null window first
+                    score = -self.solve(child_own, child_opp, -best_score - 1, -best_score)
+                    if score > best_score:
+                        score = -self.solve(child_own, child_opp, -WORST, -score + 1)
+                if score > best_score:
+                    best_score = score
+                    best_bit = bit
+        finally:
+            self._deadline = None
+            self._node_limit = None
+            self._bounds = {}
+        if best_bit is None:
+            return None, best_score
+        index = best_bit.bit_length() - 1
+        return [index // SIZE, index % SIZE], best_score
+
+    def solve(self, own, opp, alpha, beta):
+        # Returns the final disc difference for own with both sides playing perfectly (fail-soft alpha beta).
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            if self._deadline is not None and perf_counter() > self._deadline \
+                    or self._node_limit is not None and self.nodes > self._node_limit:
+                raise EndgameTimeout()
+        moves = calc_move_mask(own, opp)
+        if not moves:
+            if not calc_move_mask(opp, own):
+                return popcount(own) - popcount(opp)
+            return -self.solve(opp, own, -beta, -alpha)
+
+        key = None
+        if popcount(~(own | opp) & FULL) >= BOUNDS_EMPTIES:
+            key = (own, opp)
+            bounds = self._bounds.get(key)
+            if bounds is not None:
+                if bounds[0] >= beta:
+                    return bounds[0]
+                if bounds[1] <= alpha:
+                    return bounds[1]
+                if bounds[0] == bounds[1]:
+                    return bounds[0]
+        alpha_start = alpha
+
+        best_score = -WORST
+        for bit, flips in self._ordered_moves(own, opp, moves):
+            score = -self.solve(opp ^ flips, own | bit | flips, -beta, -alpha)
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if key is not None:
+            lower, upper = self._bounds.get(key, (-WORST, WORST))
+            if best_score <= alpha_start:
+                upper = min(upper, best_score)
+            elif best_score >= beta:
+                lower = max(lower, best_score)
+            else:
+                lower = upper = best_score
+            self._bounds[key] = (lower, upper)
+        return best_score
+
+    @staticmethod
+    def _ordered_moves(own, opp, moves):
+        # Returns (move bit, flipped discs) pairs in the order to search them.
+        empty = ~(own | opp) & FULL
+        odd = 0
+        for quadrant in QUADRANTS:
+            if popcount(empty & quadrant) & 1:
+                odd |= quadrant
+        children = []
+        while moves:
+            bit = moves & -moves
+            children.append((bit, calc_flips(own, opp, bit)))
+            moves ^= bit
+        if popcount(empty) > FASTEST_FIRST_EMPTIES:
+            children.sort(key=lambda child: (popcount(calc_move_mask(opp ^ child[1], own | child[0] | child[1])),
+                                             not child[0] & odd))
+        else:
+            children.sort(key=lambda child: not child[0] & odd)
+        return children
@@ -0,0 +1,92 @@
+# Move ordering for the minimax players.
+#
+# Alpha beta prunes the most when the best move is searched first. MoveOrderer sorts the moves of a
+# node by, in order of priority:
+#   1. the best move stored in the transposition table for the position
+#   2. the killer moves of the ply, quiet moves that caused a cutoff in a sibling position
+#   3. the history table, how often and how deep a move has caused cutoffs anywhere in the search
+#   4. a static weight for the square, so corners come before the squares next to them
+# The square table is for 8x8; other board sizes get it stretched by sized_square_weights.
+
+SQUARE_WEIGHTS = [[100, -20, 10, 5, 5, 10, -20, 100],
+                  [-20, -50, -2, -2, -2, -2, -50, -20],
+                  [10, -2, -1, -1, -1, -1, -2, 10],
+                  [5, -2, -1, -1, -1, -1, -2, 5],
+                  [5, -2, -1, -1, -1, -1, -2, 5],
+                  [10, -2, -1, -1, -1, -1, -2, 10],
+                  [-20, -50, -2, -2, -2, -2, -50, -20],
+                  [100, -20, 10, 5, 5, 10, -20, 100]]
+
+KILLERS_PER_PLY = 2
+
+
+class MoveOrderer:
+
+    def __init__(self, square_weights=SQUARE_WEIGHTS):
+        self.square_weights = square_weights
+        self.weights = square_weights
+        self._sized_weights = {len(square_weights): square_weights}
+        self.killers = {}
+        self.history = {}
+
+    def new_search(self, size=8):
+        # Killers only make sense within one search, history is kept but aged so old cutoffs fade out.
+        self.set_size(size)
+        self.killers = {}
+        for key in self.history:
+            self.history[key] //= 2
+
+    def set_size(self, size):
+        # Picks the square weights for the board size being searched.
+        self.weights = self._sized_weights.get(size)
+        if self.weights is None:
+            self.weights = sized_square_weights(self.square_weights, size)
+            self._sized_weights[size] = self.weights
+
+    def order(self, moves, symbol, ply, tt_move=None):
+        '''
+        Sorts the moves of a node, most promising first
+        :param moves: the moves to sort
+        :param symbol: the side to move
+        :param ply: distance of the node from the root
+        :param tt_move: the best move stored for the position, if any
+        :return: a new list with the moves in search order
+        '''
+        killers = self.killers.get(ply, ())
+        history = self.history
+        weights = self.weights
+
+        def key(move):
+            move = tuple(move)
+            killer_rank = KILLERS_PER_PLY - killers.index(move) if move in killers else 0
+            return (move == tt_move, killer_rank, history.get((symbol, move), 0), weights[move[0]][move[1]])
+
+        return sorted(moves, key=key, reverse=True)
+
+    def record_cutoff(self, move, symbol, ply, remaining):
+        # Called when move caused a beta cutoff with remaining plies left to search below the node.
+        move = tuple(move)
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLERS_PER_PLY:]
+        self.history[(symbol, move)] = self.history.get((symbol, move), 0) + remaining * remaining
+
+
+
+def sized_square_weights(weights, size):
+    '''
+    Fits a square table to another board size: each square takes the weight of the square of the table that
+    is as far from the same edges, the squares further in than the middle of the table taking its middle's
+    :param weights: a square table, indexed [x][y]
+    :return: the table for size
+    '''
+    half = len(weights) // 2
+
+    def fit(c):
+        # the table coordinate on the same side as c, as far from that edge but no further than the middle
+        if c < size // 2:
+            return min(c, half - 1)
+        return len(weights) - 1 - min(size - 1 - c, half - 1)
+
+    return [[weights[fit(x)][fit(y)] for y in range(size)] for x in range(size)]
@@ -0,0 +1,145 @@
+# Negamax version of MiniMaxComputerPlayer's search, with principal variation search.
+#
+# The first move of a node gets the full window, the others are only tested against a null window and
+# searched again if they turn out better. At the root alpha is carried from one move to the next, and
+# timed players search each iteration inside an aspiration window around the score of the previous one.
+# Scores are from the point of view of the side to move; the root values are the ones plain alpha beta
+# finds, and transposition table entries are shared with the minimax search.
+from math import inf, nextafter
+from time import perf_counter
+from player1.MiniMaxPlayer import MiniMaxComputerPlayer, SearchTimeout
+from symmetry import transform_move
+from player1.transposition import EXACT, LOWER_BOUND, UPPER_BOUND, TERMINAL_DEPTH
+
+# Half width of the window the root is searched with around the previous iteration's score.
+ASPIRATION_WINDOW = 30
+
+
+class NegamaxComputerPlayer(MiniMaxComputerPlayer):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._previous_score = None
+
+    def search(self, board):
+        self._previous_score = None
+        return super().search(board)
+
+    def search_root(self, board, possible_moves):
+        # Searches the root inside an aspiration window, widening it when the result falls outside.
+        if self.parallel is not None or not self.ab_pruning:
+            return super().search_root(board, possible_moves)
+        alpha, beta = -inf, inf
+        if self._previous_score is not None:
+            alpha, beta = self._previous_score - ASPIRATION_WINDOW, self._previous_score + ASPIRATION_WINDOW
+        while True:
+            best_move, best_score = self.search_root_window(board, possible_moves, alpha, beta)
+            if best_score <= alpha and alpha != -inf:
+                alpha = -inf
+            elif best_score >= beta and beta != inf:
+                beta = inf
+            else:
+                break
+        self._previous_score = best_score
+        return best_move, best_score
+
+    def search_root_window(self, board, possible_moves, alpha, beta):
+        opp = board.get_opponent_symbol(self.symbol)
+        best_move = possible_moves[0]
+        best_score = -inf
+        for i, move in enumerate(possible_moves):
+            record = board.make_move(self.symbol, move)
+            score = self.principal_variation(board, 1, opp, alpha, beta, i == 0)
+            board.undo_move(record)
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        return best_move, best_score
+
+    def principal_variation(self, board, depth, to_move, alpha, beta, full_window):
+        # Scores the position after a move for the mover: a null window test first unless full_window is set.
+        if full_window:
+            return -self.negamax(board, depth, to_move, -beta, -alpha)
+        upper = nextafter(alpha, inf)
+        score = -self.negamax(board, depth, to_move, -upper, -alpha)
+        if alpha < score < beta:
+            score = -self.negamax(board, depth, to_move, -beta, -alpha)
+        return score
+
+    def negamax(self, board, depth, to_move, alpha, beta):
+        '''
+        Recursive negamax search with principal variation search
+        :param board: the board being played on
+        :param depth: distance from the root
+        :param to_move: the side to move
+        :return: the value of the position for to_move
+        '''
+        if self._deadline is not None and perf_counter() > self._deadline:
+            raise SearchTimeout()
+        stats = self.stats
+        stats.nodes += 1
+        opp = board.get_opponent_symbol(to_move)
+        key, t = self.position_key(board, to_move)
+        remaining = self.target - depth
+        stats.tt_probes += 1
+        entry = self.trans_table.probe(key)
+        if entry is not None:
+            stats.tt_hits += 1
+            if entry[0] >= remaining:
+                flag, score = entry[1], entry[2]
+                if flag == EXACT or (flag == LOWER_BOUND and score >= beta) or (flag == UPPER_BOUND and score <= alpha):
+                    stats.tt_cutoffs += 1
+                    return score
+
+        if not board.game_continues():
+            stats.leaves += 1
+            s = self.evaluation_function(board, self.symbol)
+            s = s if to_move == self.symbol else -s
+            self.trans_table.store(key, TERMINAL_DEPTH, EXACT, s, None)
+            return s
+        if depth >= self.target:
+            stats.leaves += 1
+            s = self.evaluation_function(board, self.symbol)
+            s = s if to_move == self.symbol else -s
+            self.trans_table.store(key, 0, EXACT, s, None)
+            return s
+
+        possible_moves = self.prune_moves(board, board.calc_valid_moves(to_move), to_move, depth)
+        if not possible_moves:
+            # to_move has to pass, the game goes on with the other side
+            return -self.negamax(board, depth+1, opp, -beta, -alpha)
+        possible_moves = self.order_moves(possible_moves, to_move, depth, self.table_move(entry, t, board))
+
+        alpha_start = alpha
+        best_score = -inf
+        best_move = None
+        for i, move in enumerate(possible_moves):
+            record = board.make_move(to_move, move)
+            if self.ab_pruning:
+                score = self.principal_variation(board, depth+1, opp, alpha, beta, i == 0)
+            else:
+                score = -self.negamax(board, depth+1, opp, -inf, inf)
+            board.undo_move(record)
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if self.ab_pruning and score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if self.move_ordering is not None:
+                            self.move_ordering.record_cutoff(move, to_move, depth, remaining)
+                        break
+
+        if best_score <= alpha_start:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.trans_table.store(key, remaining, flag, best_score, transform_move(t, best_move, board.get_size()))
+        return best_score
@@ -0,0 +1,202 @@
+# Opening book: precomputed moves for positions near the start of the game.
+#
+# The book file is a small header followed by fixed size records sorted by key:
+#   header: magic b'RVBK', format version (uint16), board size (uint8), record count (uint32)
+#   record: position key (uint64), move x * size + y (uint8), weight (uint16)
+# all little endian. OpeningBook memory maps the file and binary searches it, so opening a book costs
+# nothing and a lookup is a few dozen reads.
+#
+# Keys are the board's canonical_hash with the side to move folded in: the hash is the same for all 8
+# rotations and reflections of a position and the move is stored in the canonical orientation, so one
+# entry covers every symmetric copy of a position. The hash doesn't depend on lookup.pickle, so a book
+# file stays valid whatever Zobrist keys the players use.
+import mmap
+import struct
+import warnings
+from collections import defaultdict
+from os import getcwd
+from reversi_bitboard import BitReversiBoard
+from symmetry import transform, inverse_transform
+from player1.transposition import SIDE_TO_MOVE_KEY
+
+MAGIC = b'RVBK'
+VERSION = 2
+HEADER = struct.Struct('<4sHBI')
+RECORD = struct.Struct('<QBH')
+
+DEFAULT_PATH = getcwd() + '/player1/opening_book.bin'
+
+
+def canonical_key(board, to_move):
+    '''
+    Hashes a position the same way for all of its symmetric copies
+    :param board: the board being played on
+    :param to_move: the side to move
+    :return: the key and the symmetry that maps the board onto the orientation the key was taken in
+    '''
+    key, t = board.canonical_hash()
+    if to_move == 'O':
+        key ^= SIDE_TO_MOVE_KEY
+    return key, t
+
+
+class OpeningBook:
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.size = 8
+        self.count = 0
+        self._file = None
+        self._map = None
+        try:
+            self._file = open(path, 'rb')
+        except OSError:
+            # no book yet: every lookup misses
+            return
+        header = self._file.read(HEADER.size)
+        if len(header) == HEADER.size:
+            magic, version, size, count = HEADER.unpack(header)
+        if len(header) < HEADER.size or magic != MAGIC or version != VERSION:
+            # an older format or some other file: play without a book rather than not at all
+            self.close()
+            warnings.warn(path + " is not an opening book of this version, rebuild it; playing without a book")
+            return
+        self.size, self.count = size, count
+        if self.count:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, board, symbol):
+        # Returns the book move for symbol as [x, y], or None when the position isn't in the book.
+        if self._map is None or board.get_size() != self.size:
+            return None
+        key, t = canonical_key(board, symbol)
+        record = self._find(key)
+        if record is None:
+            return None
+        move = record[1]
+        x, y = inverse_transform(t, move // self.size, move % self.size, self.size)
+        return [x, y]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _find(self, key):
+        # Binary search over the sorted records.
+        low, high = 0, self.count - 1
+        while low <= high:
+            mid = (low + high) // 2
+            record = RECORD.unpack_from(self._map, HEADER.size + mid * RECORD.size)
+            if record[0] < key:
+                low = mid + 1
+            elif record[0] > key:
+                high = mid - 1
+            else:
+                return record
+        return None
+
+    def __getstate__(self):
+        # the memory map can't be pickled (e.g. to send a player to a worker process), reopen it instead
+        state = self.__dict__.copy()
+        state['_file'] = None
+        state['_map'] = None
+        state['_path'] = self._file.name if self._file is not None else None
+        return state
+
+    def __setstate__(self, state):
+        path = state.pop('_path')
+        self.__dict__.update(state)
+        if path is not None:
+            self.__init__(path)
+
+
+def write_book(entries, path, size=8):
+    # Writes a {key: (move, weight)} dict as a book file, move being x * size + y in the key's orientation.
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, size, len(entries)))
+        for key in sorted(entries):
+            move, weight = entries[key]
+            f.write(RECORD.pack(key, move, min(weight, 0xFFFF)))
+
+
+def build_from_search(player, plies, path=DEFAULT_PATH, board_class=BitReversiBoard):
+    '''
+    Builds a book by searching every position reachable in the first plies moves
+    :param player: a player whose get_move picks the book move, searched for both sides; its own book is
+    closed and not consulted
+    :param plies: how many moves deep the book goes
+    :return: the number of positions in the book
+    '''
+    # the player's own book would hand back the old entries instead of searching them again, and the file
+    # it maps is about to be rewritten
+    if player.opening_book is not None:
+        player.opening_book.close()
+        player.opening_book = None
+    entries = {}
+    frontier = [(board_class(), 'X')]
+    for ply in range(plies):
+        next_frontier = []
+        for board, to_move in frontier:
+            moves = board.calc_valid_moves(to_move)
+            if not moves:
+                continue
+            key, t = canonical_key(board, to_move)
+            if key in entries:
+                continue
+            player.symbol = to_move
+            move = player.get_move(board.copy())
+            x, y = transform(t, move[0], move[1], board.get_size())
+            entries[key] = (x * board.get_size() + y, plies - ply)
+            for reply in moves:
+                child = board.copy()
+                child.make_move(to_move, reply)
+                next_frontier.append((child, board.get_opponent_symbol(to_move)))
+        frontier = next_frontier
+    write_book(entries, path)
+    return len(entries)
+
+
+def build_from_games(records, plies, path=DEFAULT_PATH, min_games=10, board_class=BitReversiBoard):
+    '''
+    Builds a book from self-play statistics: for each early position, the move that scored best for its side
+    :param records: games as GameRecords, from simulator.simulate_games or game_records.read_records
+    :param plies: how many moves into each game to collect
+    :param min_games: moves played in fewer games than this are left out
+    :return: the number of positions in the book
+    '''
+    from game_records import replay
+    # key -> move -> [games, points for the mover]
+    stats = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for record in records:
+        for board, to_move, square in replay(record, board_class, plies=plies):
+            if square is not None:
+                size = board.get_size()
+                opponent = board.get_opponent_symbol(to_move)
+                result = record.scores[to_move] - record.scores[opponent]
+                key, t = canonical_key(board, to_move)
+                x, y = transform(t, square[0], square[1], size)
+                entry = stats[key][x * size + y]
+                entry[0] += 1
+                entry[1] += 1 if result > 0 else 0.5 if result == 0 else 0
+    entries = {}
+    for key, moves in stats.items():
+        best = max(moves.items(), key=lambda item: (item[1][0] >= min_games, item[1][1] / item[1][0]))
+        if best[1][0] >= min_games:
+            entries[key] = (best[0], best[1][0])
+    write_book(entries, path)
+    return len(entries)
+
+
+def main():
+    from player1.all_players import get_combined_player
+    print(build_from_search(get_combined_player('X', depth=5), 5), "positions written to", DEFAULT_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Root-split parallel search for MiniMaxComputerPlayer.
+#
+# Every root move is searched as a separate task on a process pool. Each worker process keeps its own
+# copy of the player (and so its own transposition table, which stays warm from move to move), and the
+# exact scores it sends back for the root children are merged into the parent's table. Children are
+# searched with a full window, so their scores are the same ones the serial search computes and the
+# parent picks the same move given the same root order.
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+from time import time, perf_counter
+from player1.MiniMaxPlayer import SearchTimeout
+from player1.search_stats import SearchStats
+from player1.transposition import TranspositionTable
+
+_worker_player = None
+
+
+class RootSplitter:
+
+    def __init__(self, player, workers):
+        self.player = player
+        self.workers = workers
+        self._pool = None
+
+    def search_children(self, board, possible_moves, deadline=None, stats=None):
+        '''
+        Searches every root move to the player's current target on the pool
+        :param board: the root position
+        :param possible_moves: the root moves to search
+        :param deadline: optional time.time() value at which the workers give up
+        :param stats: optional SearchStats the workers' counts are added to
+        :return: the score of each move, in order, or None if any search ran out of time
+        '''
+        pool = self._get_pool()
+        futures = [pool.submit(_search_child, board, move, self.player.target, deadline) for move in possible_moves]
+        scores = []
+        for future in futures:
+            score, child_stats = future.result()
+            scores.append(score)
+            if stats is not None:
+                stats.add(child_stats)
+        if None in scores:
+            return None
+        return scores
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            worker = copy(self.player)
+            worker.trans_table = TranspositionTable()
+            worker.parallel = None
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(worker,))
+        return self._pool
+
+
+def _init_worker(player):
+    global _worker_player
+    _worker_player = player
+
+
+def _search_child(board, move, target, deadline):
+    player = _worker_player
+    player.target = target
+    player._deadline = None if deadline is None else perf_counter() + (deadline - time())
+    player.stats = SearchStats()
+    if player.move_ordering is not None:
+        player.move_ordering.set_size(board.get_size())
+    board.make_move(player.symbol, move)
+    try:
+        return player.minimax(board, 1, False, float('-inf'), float('inf')), player.stats
+    except SearchTimeout:
+        return None, player.stats
+    finally:
+        player._deadline = None
@@ -0,0 +1,132 @@
+# Fits the weights of the pattern evaluator (patterns.py) to self-play games.
+#
+# Every position of every game is encoded from both sides' point of view, with the final disc
+# difference for that side as the target. The weights of each stage are then the ridge regularized
+# least squares solution, found with conjugate gradients on the normal equations so the sparse design
+# matrix (one 1 per pattern instance in each row) never has to be built.
+#
+# Needs numpy, which playing with the trained weights does not.
+import random
+import sys
+import numpy as np
+from reversi_bitboard import BitReversiBoard
+from reversi_players import RandomComputerPlayer
+from simulator import simulate_games
+from game_records import read_records, replay
+from player1.patterns import DEFAULT_PATH, NUM_STAGES, NUM_WEIGHTS, feature_indexes, write_weights
+
+# Weight of the penalty on the size of the weights, keeps patterns seen in few games close to 0.
+RIDGE = 50.0
+CG_ITERATIONS = 200
+
+
+def training_set(records, board_class=BitReversiBoard):
+    '''
+    Encodes the positions of finished games
+    :param records: GameRecords, e.g. from simulator.simulate_games or game_records.read_records
+    :return: stage (N,), feature index (N, instances + 1) and target (N,) arrays
+    '''
+    stages = []
+    indexes = []
+    targets = []
+    for record in records:
+        result = record.scores['X'] - record.scores['O']
+        for board, _, _ in replay(record, board_class):
+            x, o = board.get_bitboards()
+            for own, opp, target in ((x, o, result), (o, x, -result)):
+                stage, features = feature_indexes(own, opp)
+                stages.append(stage)
+                indexes.append(features)
+                targets.append(target)
+    return (np.array(stages, dtype=np.int64), np.array(indexes, dtype=np.int64).reshape(len(stages), -1),
+            np.array(targets, dtype=np.float64))
+
+
+def fit_stage(indexes, targets, ridge=RIDGE, iterations=CG_ITERATIONS):
+    # Solves (A^T A + ridge I) w = A^T y for the rows of one stage, A having a 1 at each feature index.
+    def normal(w):
+        residual = w[indexes].sum(axis=1)
+        return np.bincount(indexes.ravel(), weights=np.repeat(residual, indexes.shape[1]),
+                           minlength=NUM_WEIGHTS) + ridge * w
+
+    rhs = np.bincount(indexes.ravel(), weights=np.repeat(targets, indexes.shape[1]), minlength=NUM_WEIGHTS)
+    w = np.zeros(NUM_WEIGHTS)
+    r = rhs.copy()
+    p = r.copy()
+    rr = r @ r
+    for _ in range(iterations):
+        if rr < 1e-10:
+            break
+        ap = normal(p)
+        alpha = rr / (p @ ap)
+        w += alpha * p
+        r -= alpha * ap
+        rr, rr_old = r @ r, rr
+        p = r + (rr / rr_old) * p
+    return w
+
+
+def train(records, path=DEFAULT_PATH, ridge=RIDGE):
+    '''
+    Fits the pattern weights to a set of games and writes them to a weight file
+    :param records: GameRecords of finished games
+    :return: the root mean squared error of the fitted weights on the games, per stage
+    '''
+    stages, indexes, targets = training_set(records)
+    weights = np.zeros((NUM_STAGES, NUM_WEIGHTS))
+    errors = []
+    for stage in range(NUM_STAGES):
+        rows = stages == stage
+        if not rows.any():
+            errors.append(None)
+            continue
+        weights[stage] = fit_stage(indexes[rows], targets[rows], ridge)
+        predicted = weights[stage][indexes[rows]].sum(axis=1)
+        errors.append(float(np.sqrt(np.mean((predicted - targets[rows]) ** 2))))
+    write_weights(weights, path)
+    return errors
+
+
+class _SelfPlayPlayer:
+    # Plays randomly for the first few moves and then picks the move the evaluation likes best, with
+    # some random moves mixed in so the games cover many positions.
+
+    def __init__(self, symbol, evaluation_function, random_plies=8, epsilon=0.1):
+        self.symbol = symbol
+        self.evaluation_function = evaluation_function
+        self.random_plies = random_plies
+        self.epsilon = epsilon
+        self._random = RandomComputerPlayer(symbol)
+
+    def get_move(self, board):
+        scores = board.calc_scores()
+        if scores['X'] + scores['O'] - 4 < self.random_plies or random.random() < self.epsilon:
+            return self._random.get_move(board)
+        best_move = None
+        best_score = None
+        for move in board.calc_valid_moves(self.symbol):
+            record = board.make_move(self.symbol, move)
+            score = self.evaluation_function(board, self.symbol)
+            board.undo_move(record)
+            if best_score is None or score > best_score:
+                best_score = score
+                best_move = move
+        return best_move
+
+
+def main():
+    # python -m player1.pattern_train [number of self-play games | game record file]
+    from player1.MiniMaxPlayer import combined_heuristics
+    source = sys.argv[1] if len(sys.argv) > 1 else '2000'
+    if source.isdigit():
+        records = simulate_games(_SelfPlayPlayer('X', combined_heuristics), _SelfPlayPlayer('O', combined_heuristics),
+                                 int(source))
+    else:
+        records = read_records(source)
+    errors = train(records)
+    print("trained on", source, "error per stage:", ["-" if e is None else round(e, 1) for e in errors])
+    print("weights written to", DEFAULT_PATH)
+
+
+if __name__ == "__main__":
+    main()
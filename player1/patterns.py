@@ -0,0 +1,228 @@
+# Pattern evaluation: the value of a position is a sum of table lookups, one per pattern instance.
+#
+# A pattern is a line or block of squares (an edge, the second to fourth rows, the diagonals of length 4
+# to 8 and the 3x3 corner block). Each of its rotations and reflections on the board is an instance, and
+# all instances of a pattern share one table indexed by the base-3 encoding of their squares (0 empty,
+# 1 own disc, 2 opponent disc). Tables are kept per game stage, since an edge configuration that is
+# good early can be bad late. The weights are fitted by pattern_train.py and predict the final disc
+# difference for the side the position is evaluated for.
+#
+# To keep an instance down to a couple of lookups, the bitboards are also looked at transposed and
+# pseudo-rotated by 45 degrees so that each line of squares sits inside one byte; every instance reads
+# the orientation where it spans the fewest bytes and adds up precomputed per-byte index tables.
+#
+# Weight file: header magic b'RVPW', format version (uint16), board size (uint8), stage count (uint8),
+# weights per stage (uint32), then the float32 weights stage by stage, all little endian.
+import struct
+import sys
+from array import array
+from os import getcwd
+from reversi_bitboard import BitReversiBoard, FULL, SIZE, popcount
+from symmetry import transform
+
+MAGIC = b'RVPW'
+VERSION = 1
+HEADER = struct.Struct('<4sHBBI')
+
+DEFAULT_PATH = getcwd() + '/player1/pattern_weights.bin'
+
+NUM_STAGES = 13
+
+PATTERNS = [
+    ('edge', [(0, y) for y in range(SIZE)]),
+    ('row2', [(1, y) for y in range(SIZE)]),
+    ('row3', [(2, y) for y in range(SIZE)]),
+    ('row4', [(3, y) for y in range(SIZE)]),
+    ('diag8', [(i, i) for i in range(8)]),
+    ('diag7', [(i, i + 1) for i in range(7)]),
+    ('diag6', [(i, i + 2) for i in range(6)]),
+    ('diag5', [(i, i + 3) for i in range(5)]),
+    ('diag4', [(i, i + 4) for i in range(4)]),
+    ('corner3x3', [(x, y) for x in range(3) for y in range(3)]),
+]
+
+
+# The views work on both bitboards at once, packed into one 128-bit integer with the opponent's discs
+# in the high 64 bits, so every mask is repeated in both halves.
+def _both(mask):
+    return mask | mask << 64
+
+
+_TRANSPOSE_MASKS = [(28, _both(0x0F0F0F0F00000000)), (14, _both(0x3333000033330000)), (7, _both(0x5500550055005500))]
+_ROTATE_MASKS = {n: (_both((1 << (64 - n)) - 1), _both(FULL ^ ((1 << (64 - n)) - 1))) for n in (8, 16, 32)}
+
+
+def _transpose(bits):
+    # symmetry.transpose on both halves
+    for shift, mask in _TRANSPOSE_MASKS:
+        t = mask & (bits ^ (bits << shift))
+        bits ^= t ^ (t >> shift)
+    return bits
+
+
+def _rotate_right(bits, n):
+    # Rotates each 64-bit half right by n.
+    low, high = _ROTATE_MASKS[n]
+    return (bits >> n) & low | (bits << (64 - n)) & high
+
+
+_ROTATE45_MASKS = [_both(0xAAAAAAAAAAAAAAAA), _both(0xCCCCCCCCCCCCCCCC), _both(0xF0F0F0F0F0F0F0F0)]
+_ROTATE45_ANTI_MASKS = [_both(0x5555555555555555), _both(0x3333333333333333), _both(0x0F0F0F0F0F0F0F0F)]
+
+
+def _pseudo_rotate(bits, masks):
+    k1, k2, k4 = masks
+    bits ^= k1 & (bits ^ _rotate_right(bits, 8))
+    bits ^= k2 & (bits ^ _rotate_right(bits, 16))
+    return bits ^ (k4 & (bits ^ _rotate_right(bits, 32)))
+
+
+def _rotate45(bits):
+    # Moves every diagonal running with (i, i) into a single byte.
+    return _pseudo_rotate(bits, _ROTATE45_MASKS)
+
+
+def _rotate45_anti(bits):
+    # Moves every diagonal running with (i, -i) into a single byte.
+    return _pseudo_rotate(bits, _ROTATE45_ANTI_MASKS)
+
+
+def _identity(bits):
+    return bits
+
+
+# the orientations of the bitboards instances can be read from
+VIEWS = [_identity, _transpose, _rotate45, _rotate45_anti]
+
+
+def _build_instances():
+    # Returns the table size of each pattern, and for every instance its pattern index, the offset of its
+    # table in a stage's weights and the (view, byte, own table, opponent table) parts its index is read from.
+    sizes = []
+    instances = []
+    offset = 0
+    for p, (name, squares) in enumerate(PATTERNS):
+        sizes.append(3 ** len(squares))
+        seen = set()
+        for t in range(8):
+            placed = [transform(t, x, y, SIZE) for x, y in squares]
+            if frozenset(placed) in seen:
+                continue
+            seen.add(frozenset(placed))
+            best = None
+            for v, view in enumerate(VIEWS):
+                bits = [view(1 << (x * SIZE + y)).bit_length() - 1 for x, y in placed]
+                if best is None or len({b // 8 for b in bits}) < len({b // 8 for b in best[1]}):
+                    best = (v, bits)
+            v, bits = best
+            parts = []
+            for row in sorted({b // 8 for b in bits}):
+                own = [0] * 256
+                for byte in range(256):
+                    for k, b in enumerate(bits):
+                        if b // 8 == row and byte >> (b % 8) & 1:
+                            own[byte] += 3 ** k
+                # the opponent's byte of a view comes 8 bytes after the own one
+                parts.append((v, row, row + 8, own, [2 * i for i in own]))
+            instances.append((p, offset, parts))
+        offset += sizes[-1]
+    return sizes, instances
+
+
+PATTERN_SIZES, INSTANCES = _build_instances()
+# one extra weight per stage for a constant term
+NUM_WEIGHTS = sum(PATTERN_SIZES) + 1
+# most instances sit in a single byte, they skip the loop over parts when evaluating
+_SINGLE_BYTE = [(offset,) + parts[0] for _, offset, parts in INSTANCES if len(parts) == 1]
+_MULTI_BYTE = [(offset, parts) for _, offset, parts in INSTANCES if len(parts) > 1]
+
+
+def stage_of(own, opp):
+    return (popcount(own | opp) - 4) * NUM_STAGES // (SIZE * SIZE - 3)
+
+
+def feature_indexes(own, opp):
+    '''
+    Encodes a position for the weight tables
+    :param own: bitboard of the side the position is evaluated for
+    :param opp: bitboard of the other side
+    :return: the stage and the index of the weight every instance reads, the constant term last
+    '''
+    views = _view_bytes(own, opp)
+    indexes = []
+    for _, offset, parts in INSTANCES:
+        index = offset
+        for v, own_row, opp_row, own_table, opp_table in parts:
+            index += own_table[views[v][own_row]] + opp_table[views[v][opp_row]]
+        indexes.append(index)
+    indexes.append(NUM_WEIGHTS - 1)
+    return stage_of(own, opp), indexes
+
+
+def _view_bytes(own, opp):
+    # Returns the 16 bytes, own discs then opponent discs, of the position in every view.
+    both = own | opp << 64
+    return [view(both).to_bytes(16, 'little') for view in VIEWS]
+
+
+class PatternWeights:
+
+    def __init__(self, path=DEFAULT_PATH):
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError(path + " is not a pattern weight file")
+            magic, version, size, stages, count = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION or size != SIZE or stages != NUM_STAGES \
+                    or count != NUM_WEIGHTS:
+                raise ValueError(path + " doesn't hold weights for these patterns")
+            weights = array('f')
+            weights.fromfile(f, stages * count)
+        if sys.byteorder == 'big':
+            weights.byteswap()
+        self.stages = [weights[s * count:(s + 1) * count] for s in range(stages)]
+
+    def evaluate(self, own, opp):
+        # Returns the predicted final disc difference for own.
+        views = _view_bytes(own, opp)
+        weights = self.stages[stage_of(own, opp)]
+        score = weights[NUM_WEIGHTS - 1]
+        for offset, v, own_row, opp_row, own_table, opp_table in _SINGLE_BYTE:
+            score += weights[offset + own_table[views[v][own_row]] + opp_table[views[v][opp_row]]]
+        for offset, parts in _MULTI_BYTE:
+            index = offset
+            for v, own_row, opp_row, own_table, opp_table in parts:
+                index += own_table[views[v][own_row]] + opp_table[views[v][opp_row]]
+            score += weights[index]
+        return score
+
+
+def write_weights(weights, path=DEFAULT_PATH):
+    # Writes a stages x NUM_WEIGHTS sequence of rows of weights as a weight file.
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, SIZE, len(weights), NUM_WEIGHTS))
+        for row in weights:
+            values = array('f', row)
+            if sys.byteorder == 'big':
+                values.byteswap()
+            values.tofile(f)
+
+
+_weights = None
+
+
+def load_weights(path=DEFAULT_PATH):
+    # Makes pattern_heuristic use the weights stored at path.
+    global _weights
+    _weights = PatternWeights(path)
+
+
+def pattern_heuristic(board, symbol):
+    if _weights is None:
+        load_weights()
+    if not hasattr(board, 'get_bitboards'):
+        board = BitReversiBoard.from_board(board)
+    x, o = board.get_bitboards()
+    if symbol == 'X':
+        return _weights.evaluate(x, o)
+    return _weights.evaluate(o, x)
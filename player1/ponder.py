@@ -0,0 +1,137 @@
+# Pondering: searching on the opponent's time.
+#
+# Once a player's move is on the board, a background process takes the opponent's likeliest replies (the
+# ones the player's own evaluation likes least) and searches the position after each of them, one depth
+# at a time across all of them, sending back the best move found for every position and depth. When the
+# player is asked for its next move the process is stopped and what it sent is looked up by the
+# position's hash: an exact endgame result or a fixed depth search that got to the player's depth is
+# played as is, anything shallower is a warm start (the move is searched first and a timed player
+# continues deepening from where the pondering got to). A player with a memory mapped transposition
+# table also shares every entry the pondering stored, since the file's pages are shared between processes.
+#
+# The process is forked from the player, so it starts with the player's tables and history, and it is
+# simply terminated when it's no longer needed. Results travel over a pipe in messages short enough to
+# be written atomically, so terminating never leaves half a message behind.
+from copy import copy
+from multiprocessing import Pipe, Process
+from time import perf_counter
+from player1.MiniMaxPlayer import SearchTimeout
+from player1.search_stats import SearchStats
+
+# How many replies to ponder, likeliest first.
+PONDER_REPLIES = 4
+# Pondering gives up after this many seconds even if nobody stops it, e.g. once the game is over.
+PONDER_LIMIT = 60.0
+
+# Set in processes whose players mustn't ponder, see disable_pondering.
+_disabled = False
+
+
+def disable_pondering():
+    # Pool initializer of the tournament and game server workers: they already keep every CPU busy with
+    # games, so a pondering process per player would only oversubscribe them and skew the search times.
+    global _disabled
+    _disabled = True
+
+
+class Ponderer:
+
+    def __init__(self, player, replies=PONDER_REPLIES, limit=PONDER_LIMIT):
+        self.player = player
+        self.replies = replies
+        self.limit = limit
+        self._process = None
+        self._connection = None
+
+    def start(self, board):
+        '''
+        Starts pondering the position the opponent is to move in
+        :param board: the board right after the player's move, which the opponent is to reply to
+        '''
+        self.stop()
+        if _disabled:
+            return
+        worker = copy(self.player)
+        worker.ponderer = None
+        receiver, sender = Pipe(duplex=False)
+        self._process = Process(target=_ponder, args=(worker, board.copy(), self.replies, self.limit, sender),
+                                daemon=True)
+        self._process.start()
+        sender.close()
+        self._connection = receiver
+
+    def stop(self):
+        '''
+        Stops pondering
+        :return: a dict from the hash of each pondered position to the (depth, move, exact) of the deepest search of it
+        '''
+        results = {}
+        if self._process is None:
+            return results
+        try:
+            while self._connection.poll():
+                key, depth, move, exact = self._connection.recv()
+                results[key] = (depth, move, exact)
+        except (EOFError, OSError):
+            pass
+        self._process.terminate()
+        self._process.join()
+        self._connection.close()
+        self._process = None
+        self._connection = None
+        return results
+
+
+def _ponder(player, board, replies, limit, connection):
+    # Runs in the pondering process until it's terminated or has searched everything as far as it can.
+    player.stats = SearchStats()
+    player._deadline = perf_counter() + limit
+    board.set_zobrist_keys(player.zobrist_keys(board.get_size()))
+    symbol = player.symbol
+    opponent = board.get_opponent_symbol(symbol)
+    positions = []
+    for reply in board.calc_valid_moves(opponent):
+        position = board.copy()
+        position.make_move(opponent, reply)
+        moves = position.calc_valid_moves(symbol)
+        if not moves:
+            continue
+        if player.opening_book is not None and player.opening_book.lookup(position, symbol) is not None:
+            # the player answers from the book without searching anyway
+            continue
+        positions.append((player.evaluation_function(position, symbol), position, moves))
+    positions.sort(key=lambda p: p[0])
+    searches = []
+    try:
+        for _, position, moves in positions[:replies]:
+            key = player.hash(position)
+            if player.endgame_empties is not None:
+                move = player.solve_endgame(position, perf_counter())
+                if move is not None:
+                    connection.send((key, player.stats.depth, list(move), True))
+                    continue
+            moves = player.prune_moves(position, moves, symbol, 0)
+            if player.move_ordering is not None:
+                player.move_ordering.new_search(position.get_size())
+            moves = player.order_moves(moves, symbol, 0, None)
+            scores = position.calc_scores()
+            empties = position.get_size() ** 2 - scores['X'] - scores['O']
+            # the last score goes with each position: a negamax player centres its aspiration window on the
+            # previous search's score, which has to be this position's, not the one searched before it
+            searches.append([key, position, moves, empties if player.time_limit is not None else player.target, None])
+        depth = 1
+        while searches:
+            for search in searches:
+                key, position, moves, _, previous_score = search
+                player.target = depth
+                player._previous_score = previous_score
+                move, search[4] = player.search_root(position, moves)
+                moves.remove(move)
+                moves.insert(0, move)
+                connection.send((key, depth, list(move), False))
+            depth += 1
+            searches = [search for search in searches if search[3] >= depth]
+    except SearchTimeout:
+        pass
+    finally:
+        connection.close()
@@ -0,0 +1,103 @@
+# Statistics about a player's search for one move.
+#
+# MiniMaxComputerPlayer.search returns a SearchStats with the move it picked and counts of what the
+# search did. Counting is always on; the time split between move generation, evaluation and board
+# copying (including make/undo) is only measured by players built with profile=True, since timing
+# every call slows the search down. A player with a trace path also appends every move's statistics
+# to that file as one JSON object per line, which tournament.summarize_trace aggregates.
+import json
+from time import perf_counter
+
+COUNTERS = ['nodes', 'leaves', 'tt_probes', 'tt_hits', 'tt_cutoffs', 'beam_calls', 'beam_pruned']
+TIMES = ['move_generation_time', 'evaluation_time', 'copy_time']
+
+
+class SearchStats:
+
+    def __init__(self):
+        self.move = None
+        # 'search', 'book', 'endgame' or 'ponder'
+        self.source = 'search'
+        # deepest search that finished, in plies
+        self.depth = 0
+        # depth pondering had searched the position to before the move was asked for, 0 if it hadn't
+        self.pondered = 0
+        self.elapsed = 0.0
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        for name in TIMES:
+            setattr(self, name, 0.0)
+        self._timing = False
+
+    def effective_branching_factor(self):
+        # The branching factor of a uniform tree of the searched depth with as many nodes.
+        if self.depth < 1 or self.nodes < 1:
+            return 0.0
+        return self.nodes ** (1 / self.depth)
+
+    def add(self, other):
+        # Adds the counts and times of another search, e.g. one a parallel worker ran.
+        for name in COUNTERS + TIMES:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def timed(self, field, function, *args, **kwargs):
+        # Calls function and adds the time it took to field, unless the call is inside another timed call.
+        if self._timing:
+            return function(*args, **kwargs)
+        self._timing = True
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            setattr(self, field, getattr(self, field) + perf_counter() - start)
+            self._timing = False
+
+    def as_dict(self):
+        record = {'move': None if self.move is None else list(self.move), 'source': self.source,
+                  'depth': self.depth, 'pondered': self.pondered, 'elapsed': self.elapsed,
+                  'effective_branching_factor': self.effective_branching_factor()}
+        for name in COUNTERS + TIMES:
+            record[name] = getattr(self, name)
+        return record
+
+    def __repr__(self):
+        return "SearchStats(" + ", ".join(k + "=" + repr(v) for k, v in self.as_dict().items()) + ")"
+
+
+class ProfiledBoard:
+    # Wraps a board and adds the time spent in its methods to a SearchStats, for profiled searches.
+
+    def __init__(self, board, stats):
+        self._board = board
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._board, name)
+
+    def calc_valid_moves(self, symbol):
+        return self._stats.timed('move_generation_time', self._board.calc_valid_moves, symbol)
+
+    def game_continues(self):
+        return self._stats.timed('move_generation_time', self._board.game_continues)
+
+    def make_move(self, symbol, position):
+        return self._stats.timed('copy_time', self._board.make_move, symbol, position)
+
+    def undo_move(self, record):
+        return self._stats.timed('copy_time', self._board.undo_move, record)
+
+    def copy(self):
+        return ProfiledBoard(self._stats.timed('copy_time', self._board.copy), self._stats)
+
+
+def write_trace(path, record):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def read_trace(path):
+    # Yields the records of a trace file.
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,192 @@
+# Stable discs: discs that can't be flipped for the rest of the game, whatever is played.
+#
+# Finding every stable disc is a search of its own, so this finds a safe subset the usual way:
+#   - discs on an edge can only be flipped along the edge, so a table over the 3^8 edge configurations
+#     says which of them survive every way of filling the edge
+#   - a disc whose four lines (row, column and both diagonals) are full can't be flipped either
+#   - an inner disc is stable when, along each of the four lines, the line is full or a neighbour on the
+#     line is a stable disc of the same colour; this is repeated until nothing new is found
+# Bitboards are laid out like BitReversiBoard, square (x, y) on bit x * 8 + y.
+#
+# Other board sizes (reversi_generic_bitboard, square (x, y) on bit x * size + y) get the full line and
+# neighbour rules only, with the board's walls counting as stable neighbours; that finds the discs
+# anchored to corners along the edges too, just not every edge disc the 8x8 tables would.
+from reversi_bitboard import SIZE, FULL, popcount
+from reversi_generic_bitboard import geometry
+
+_INNER = 0x007E7E7E7E7E7E00
+_COLUMN_Y0 = 0x0101010101010101
+# multiplying the y = 0 column by this gathers it into the top byte, square (x, 0) on bit 56 + x
+_GATHER_COLUMN = 0x0102040810204080
+
+
+def _edge_stable(own, opp, memo):
+    # Returns the own discs of an 8-square edge that no sequence of moves on the edge can flip.
+    key = (own, opp)
+    if key in memo:
+        return memo[key]
+    stable = own
+    empty = ~(own | opp) & 0xFF
+    for square in range(8):
+        if not stable:
+            break
+        if empty >> square & 1:
+            # the square can be filled by either side, by a move that flips along the edge or not
+            stable &= _edge_stable(*_edge_play(own, opp, square), memo)
+            child_opp, child_own = _edge_play(opp, own, square)
+            stable &= _edge_stable(child_own, child_opp, memo)
+    memo[key] = stable
+    return stable
+
+
+def _edge_play(own, opp, square):
+    # Plays own on square of an edge, flipping along the edge, and returns the new (own, opp).
+    own |= 1 << square
+    for step in (1, -1):
+        flips = 0
+        i = square + step
+        while 0 <= i < 8 and opp >> i & 1:
+            flips |= 1 << i
+            i += step
+        if 0 <= i < 8 and own >> i & 1:
+            own |= flips
+            opp &= ~flips
+    return own, opp
+
+
+def _build_edge_tables():
+    # EDGE_STABLE is indexed by the base-3 encoding of an edge, read through the two byte tables.
+    own_index = [0] * 256
+    for byte in range(256):
+        for i in range(8):
+            if byte >> i & 1:
+                own_index[byte] += 3 ** i
+    table = [0] * 3 ** 8
+    memo = {}
+    for own in range(256):
+        for opp in range(256):
+            if not own & opp:
+                table[own_index[own] + 2 * own_index[opp]] = _edge_stable(own, opp, memo)
+    return own_index, [2 * i for i in own_index], table
+
+
+OWN_INDEX, OPP_INDEX, EDGE_STABLE = _build_edge_tables()
+# byte -> the y = 0 column with square (x, 0) set for every bit x of the byte
+COLUMN_BITS = [sum(1 << (x * SIZE) for x in range(SIZE) if byte >> x & 1) for byte in range(256)]
+
+
+def _ray_masks(dx, dy):
+    # For the ray in direction (dx, dy), the squares fewer than 1, 2 and 4 steps from the end of the board.
+    masks = []
+    for distance in (1, 2, 4):
+        mask = 0
+        for x in range(SIZE):
+            for y in range(SIZE):
+                if not (0 <= x + distance * dx < SIZE and 0 <= y + distance * dy < SIZE):
+                    mask |= 1 << (x * SIZE + y)
+        masks.append(mask)
+    return masks
+
+
+# (shift, forward ray masks, backward ray masks) for rows, columns, diagonals and anti-diagonals
+_LINE_DIRECTIONS = [(dx * SIZE + dy, _ray_masks(dx, dy), _ray_masks(-dx, -dy))
+                    for dx, dy in ((0, 1), (1, 0), (1, 1), (1, -1))]
+
+
+def full_lines(filled):
+    # Returns, for each direction, the squares whose line in that direction is full.
+    result = []
+    for shift, forward_ends, backward_ends in _LINE_DIRECTIONS:
+        # doubling: after each step a square holds the AND of the next 2, 4 and 8 squares of its ray
+        forward = filled & (filled >> shift | forward_ends[0])
+        forward &= forward >> 2 * shift | forward_ends[1]
+        forward &= forward >> 4 * shift | forward_ends[2]
+        backward = filled & (filled << shift | backward_ends[0])
+        backward &= backward << 2 * shift | backward_ends[1]
+        backward &= backward << 4 * shift | backward_ends[2]
+        result.append(forward & backward & FULL)
+    return result
+
+
+def edge_stable_discs(own, opp):
+    # Returns the own discs on the four edges that can't be flipped along their edge.
+    x0 = EDGE_STABLE[OWN_INDEX[own & 0xFF] + OPP_INDEX[opp & 0xFF]]
+    x7 = EDGE_STABLE[OWN_INDEX[own >> 56] + OPP_INDEX[opp >> 56]]
+    y0 = EDGE_STABLE[OWN_INDEX[(own & _COLUMN_Y0) * _GATHER_COLUMN >> 56 & 0xFF]
+                     + OPP_INDEX[(opp & _COLUMN_Y0) * _GATHER_COLUMN >> 56 & 0xFF]]
+    y7 = EDGE_STABLE[OWN_INDEX[(own >> 7 & _COLUMN_Y0) * _GATHER_COLUMN >> 56 & 0xFF]
+                     + OPP_INDEX[(opp >> 7 & _COLUMN_Y0) * _GATHER_COLUMN >> 56 & 0xFF]]
+    return x0 | x7 << 56 | COLUMN_BITS[y0] | COLUMN_BITS[y7] << 7
+
+
+def stable_discs(own, opp, full=None):
+    '''
+    Finds discs of own that can never be flipped
+    :param own: bitboard of the side to count for
+    :param opp: bitboard of the other side
+    :param full: full_lines(own | opp), when the caller already has it
+    :return: a bitboard of stable own discs
+    '''
+    if full is None:
+        full = full_lines(own | opp)
+    full_row, full_column, full_diagonal, full_anti_diagonal = full
+    stable = edge_stable_discs(own, opp) | (own & full_row & full_column & full_diagonal & full_anti_diagonal)
+    inner = own & _INNER & ~stable
+    while inner:
+        # steps of 1 stay on a row, 8 on a column, 9 on a diagonal and 7 on an anti-diagonal, and an inner
+        # square's neighbours are all on the board, so no masks are needed
+        new = inner & (stable >> 1 | stable << 1 | full_row) & (stable >> 8 | stable << 8 | full_column) \
+            & (stable >> 9 | stable << 9 | full_diagonal) & (stable >> 7 | stable << 7 | full_anti_diagonal)
+        if not new:
+            break
+        stable |= new
+        inner ^= new
+    return stable & FULL
+
+
+def count_stable(own, opp):
+    # Returns the number of stable discs of own and of opp.
+    full = full_lines(own | opp)
+    return popcount(stable_discs(own, opp, full)), popcount(stable_discs(opp, own, full))
+
+
+def sized_stable_discs(own, opp, size):
+    # stable_discs for a board of any size, by the full line and neighbour rules alone.
+    g = geometry(size)
+    filled = own | opp
+    # the squares whose ray in each direction, wall included, is full
+    rays = []
+    for (shift, _), edge in zip(g.directions, g.edges):
+        ray = filled
+        while True:
+            new = filled & (edge | _neighbours(ray, shift, g.full))
+            if new == ray:
+                break
+            ray = new
+        rays.append(ray)
+    # directions i and i + 4 are opposite, so each of the first four is a line with its opposite
+    lines = [(rays[i] & rays[i + 4], g.edges[i] | g.edges[i + 4], g.directions[i][0]) for i in range(4)]
+    stable = 0
+    candidates = own
+    while candidates:
+        new = candidates
+        for full, walls, shift in lines:
+            new &= full | walls | _neighbours(stable, shift, g.full) | _neighbours(stable, -shift, g.full)
+        if not new:
+            break
+        stable |= new
+        candidates ^= new
+    return stable
+
+
+def count_stable_sized(own, opp, size):
+    # Returns the number of stable discs of own and of opp on a board of any size.
+    return popcount(sized_stable_discs(own, opp, size)), popcount(sized_stable_discs(opp, own, size))
+
+
+def _neighbours(bits, shift, full):
+    # Moves every bit back by one step in the direction of shift, so each square gets its neighbour's bit;
+    # squares whose neighbour is off the board get noise, which the callers cover with the wall masks.
+    if shift > 0:
+        return bits >> shift
+    return bits << -shift & full
@@ -0,0 +1,88 @@
+# Fixed size transposition table for the minimax players.
+#
+# Entries are (depth, flag, score, move) tuples where depth is the remaining search depth below the
+# position, flag says whether score is exact or only a bound, and move is the best move found (or None).
+# Scores are stored from the point of view of the side to move.
+#
+# The table is split into buckets of two slots. The first slot keeps the deepest search seen for the
+# bucket, the second is always replaced, so shallow entries near the leaves can't push out the
+# expensive ones near the root and the memory used never grows past the size picked at creation.
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Terminal positions are exact no matter how much depth is left, so they are stored as if searched this deep.
+TERMINAL_DEPTH = 64
+
+# XORed into the board hash when O is to move, so the same discs with a different side to move don't collide.
+SIDE_TO_MOVE_KEY = 0x5bd1e9955bd1e995
+
+DEFAULT_ENTRIES = 1 << 18
+
+
+class TranspositionTable:
+
+    def __init__(self, entries=DEFAULT_ENTRIES):
+        # entries is rounded down to a power of two so buckets can be picked with a mask
+        buckets = 1
+        while buckets * 4 <= entries:
+            buckets *= 2
+        self._mask = buckets - 1
+        self._keys = [None] * (buckets * 2)
+        self._entries = [None] * (buckets * 2)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def capacity(self):
+        return len(self._keys)
+
+    def probe(self, key):
+        # Returns the (depth, flag, score, move) entry stored for key, or None.
+        slot = (key & self._mask) << 1
+        if self._keys[slot] == key:
+            return self._entries[slot]
+        if self._keys[slot + 1] == key:
+            return self._entries[slot + 1]
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        entry = (depth, flag, score, move)
+        slot = (key & self._mask) << 1
+        keys = self._keys
+        entries = self._entries
+        if keys[slot] is None:
+            self._count += 1
+            keys[slot] = key
+            entries[slot] = entry
+        elif keys[slot] == key or depth >= entries[slot][0]:
+            if keys[slot] != key:
+                # the old deep entry is demoted to the always-replace slot
+                if keys[slot + 1] is None:
+                    self._count += 1
+                keys[slot + 1] = keys[slot]
+                entries[slot + 1] = entries[slot]
+            keys[slot] = key
+            entries[slot] = entry
+        else:
+            if keys[slot + 1] is None:
+                self._count += 1
+            keys[slot + 1] = key
+            entries[slot + 1] = entry
+
+    def clear(self):
+        for i in range(len(self._keys)):
+            self._keys[i] = None
+            self._entries[i] = None
+        self._count = 0
+
+
+def flip_flag(flag):
+    # A lower bound for one side is an upper bound for the other.
+    if flag == LOWER_BOUND:
+        return UPPER_BOUND
+    if flag == UPPER_BOUND:
+        return LOWER_BOUND
+    return flag
@@ -0,0 +1,226 @@
+# Transposition table kept in a memory mapped file.
+#
+# MappedTranspositionTable has the same probe/store interface and the same two-slot bucket replacement
+# as TranspositionTable, but its slots live in a fixed layout file:
+#   header: magic b'RVTT', format version (uint16), board size (uint8), pad, slot count (uint32),
+#           unused (uint32, once a used slot count; len() now counts the slots, since a shared counter
+#           can't be updated safely by several processes without a lock)
+#   Zobrist keys: size * size * 2 uint64, for (x, y, is_x) in x, y, is_x order
+#   slots: check (uint64), score (float64 bits), meta (uint32: depth | flag << 8 | move << 16)
+# where move is x * size + y, NO_MOVE for none, or WIDE_MOVE | x << 4 | y for a square outside the table's
+# board size, so one table can also hold searches on other board sizes (their Zobrist keys differ anyway).
+# all little endian. Opening the file is instant whatever its size, the pages are shared between every
+# process that maps it, and flush only writes out the pages that changed. The Zobrist keys travel with
+# the table, so a table is never read with keys it wasn't written with.
+#
+# A slot's check is its key XORed with the other two fields. A probe only accepts a slot when the XOR
+# gives back the key, so a slot half written by another process reads as a miss instead of a wrong entry.
+import mmap
+import os
+import pickle
+import random
+import struct
+from player1.transposition import DEFAULT_ENTRIES
+
+MAGIC = b'RVTT'
+VERSION = 1
+HEADER = struct.Struct('<4sHBxII')
+KEY = struct.Struct('<Q')
+SLOT = struct.Struct('<QQI')
+_DOUBLE = struct.Struct('<d')
+
+NO_MOVE = 255
+WIDE_MOVE = 0x100
+
+# Seed of the Zobrist keys for board sizes other than a table's own, fixed so every process (parallel
+# workers, pondering, later runs on the same file) hashes those positions alike.
+SIZED_KEYS_SEED = 0x52565454
+
+
+class MappedTranspositionTable:
+
+    def __init__(self, path, entries=DEFAULT_ENTRIES, size=8, lookup_path=None):
+        '''
+        Opens the table stored at path, creating it if it doesn't exist
+        :param entries: number of slots for a new table, rounded down to a power of two
+        :param size: board size for a new table
+        :param lookup_path: lookup.pickle whose Zobrist keys a new table should take over
+        '''
+        self.path = path
+        if not os.path.exists(path):
+            _create(path, entries, size, _migrate_lookup(lookup_path, size))
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, version, self.size, slots, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(path + " is not a transposition table file")
+        self._mask = slots // 2 - 1
+        self._slots_offset = HEADER.size + self.size * self.size * 2 * KEY.size
+
+    def __len__(self):
+        # Counts the valid slots, which takes a scan of the whole table.
+        slots = memoryview(self._map)[self._slots_offset:]
+        try:
+            return sum(1 for check, score_bits, meta in SLOT.iter_unpack(slots) if check ^ score_bits ^ meta)
+        finally:
+            slots.release()
+
+    def capacity(self):
+        return (self._mask + 1) * 2
+
+    def zobrist_keys(self):
+        # Returns the (x, y, is_x) -> key table stored with the slots.
+        keys = {}
+        offset = HEADER.size
+        for x in range(self.size):
+            for y in range(self.size):
+                for s in (False, True):
+                    keys[(x, y, s)] = KEY.unpack_from(self._map, offset)[0]
+                    offset += KEY.size
+        return keys
+
+    def probe(self, key):
+        # Returns the (depth, flag, score, move) entry stored for key, or None.
+        offset = self._slots_offset + ((key & self._mask) << 1) * SLOT.size
+        for slot_offset in (offset, offset + SLOT.size):
+            check, score_bits, meta = SLOT.unpack_from(self._map, slot_offset)
+            if check ^ score_bits ^ meta == key and key != 0:
+                return self._decode(score_bits, meta)
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        meta = depth | flag << 8 | self._encode_move(move) << 16
+        score_bits = KEY.unpack(_DOUBLE.pack(score))[0]
+        offset = self._slots_offset + ((key & self._mask) << 1) * SLOT.size
+        check, old_bits, old_meta = SLOT.unpack_from(self._map, offset)
+        old_key = check ^ old_bits ^ old_meta
+        if old_key == 0 or old_key == key or depth >= old_meta & 0xFF:
+            if old_key != 0 and old_key != key:
+                # the old deep entry is demoted to the always-replace slot
+                self._map[offset + SLOT.size:offset + 2 * SLOT.size] = self._map[offset:offset + SLOT.size]
+        else:
+            offset += SLOT.size
+        SLOT.pack_into(self._map, offset, key ^ score_bits ^ meta, score_bits, meta)
+
+    def entries(self):
+        # Yields (key, depth, flag, score, move) for every valid slot.
+        for slot in range(self.capacity()):
+            check, score_bits, meta = SLOT.unpack_from(self._map, self._slots_offset + slot * SLOT.size)
+            key = check ^ score_bits ^ meta
+            if key != 0:
+                yield (key,) + self._decode(score_bits, meta)
+
+    def merge(self, other):
+        '''
+        Stores every entry of another table (e.g. one written by a parallel worker) into this one
+        :param other: a MappedTranspositionTable or the path of one
+        '''
+        if not isinstance(other, MappedTranspositionTable):
+            other = MappedTranspositionTable(other)
+        if other.size != self.size or other.zobrist_keys() != self.zobrist_keys():
+            raise ValueError(other.path + " was written with different Zobrist keys")
+        for key, depth, flag, score, move in other.entries():
+            self.store(key, depth, flag, score, move)
+
+    def flush(self):
+        # Writes the changed pages back to the file.
+        self._map.flush()
+
+    def clear(self):
+        self._map[self._slots_offset:] = bytes(len(self._map) - self._slots_offset)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __getstate__(self):
+        # the memory map can't be pickled, the copy maps the same file again
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def _encode_move(self, move):
+        if move is None:
+            return NO_MOVE
+        if move[0] < self.size and move[1] < self.size:
+            return move[0] * self.size + move[1]
+        return WIDE_MOVE | move[0] << 4 | move[1]
+
+    def _decode(self, score_bits, meta):
+        move = meta >> 16
+        if move == NO_MOVE:
+            move = None
+        elif move & WIDE_MOVE:
+            move = (move >> 4 & 0xF, move & 0xF)
+        else:
+            move = (move // self.size, move % self.size)
+        return meta & 0xFF, meta >> 8 & 0xFF, _DOUBLE.unpack(KEY.pack(score_bits))[0], move
+
+
+class _KeysUnpickler(pickle.Unpickler):
+    # lookup.pickle only holds a dict of tuples, ints and bools, so nothing needs importing to read it
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError("lookup files can't reference " + module + "." + name)
+
+
+def _migrate_lookup(lookup_path, size):
+    # Returns the Zobrist keys of an existing lookup.pickle if it is usable for size, otherwise fresh ones.
+    if lookup_path is not None:
+        try:
+            with open(lookup_path, 'rb') as f:
+                keys = _KeysUnpickler(f).load()
+        except (OSError, pickle.UnpicklingError, EOFError):
+            keys = None
+        if isinstance(keys, dict) and all(isinstance(keys.get((x, y, s)), int) and 0 < keys[(x, y, s)] < 1 << 64
+                                          for x in range(size) for y in range(size) for s in (False, True)):
+            return {(x, y, s): keys[(x, y, s)] for x in range(size) for y in range(size) for s in (False, True)}
+    return {(x, y, s): random.getrandbits(64) for x in range(size) for y in range(size) for s in (False, True)}
+
+
+_sized_keys = {}
+
+
+def sized_zobrist_keys(size):
+    # Returns the (x, y, is_x) -> key table for a board size, the same in every process.
+    keys = _sized_keys.get(size)
+    if keys is None:
+        rng = random.Random(SIZED_KEYS_SEED + size)
+        keys = {}
+        for x in range(size):
+            for y in range(size):
+                for s in (False, True):
+                    # a zero key would leave the hash unchanged by the stone it stands for
+                    key = 0
+                    while key == 0:
+                        key = rng.getrandbits(64)
+                    keys[(x, y, s)] = key
+        _sized_keys[size] = keys
+    return keys
+
+
+def _create(path, entries, size, keys):
+    buckets = 1
+    while buckets * 4 <= entries:
+        buckets *= 2
+    # written under a temporary name first so other processes never map a half written header
+    temp_path = path + '.%d.tmp' % os.getpid()
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, size, buckets * 2, 0))
+        for x in range(size):
+            for y in range(size):
+                for s in (False, True):
+                    f.write(KEY.pack(keys[(x, y, s)]))
+        f.truncate(f.tell() + buckets * 2 * SLOT.size)
+    try:
+        os.link(temp_path, path)
+    except FileExistsError:
+        # another process created it first, use theirs
+        pass
+    finally:
+        os.remove(temp_path)
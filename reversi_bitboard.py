@@ -0,0 +1,262 @@
+# Bitboard backend for the reversi board. Exposes the same public interface as ReversiBoard,
+# but stores the position as two 64-bit integers (one per player) and generates moves and flips
+# with shift-and-mask operations instead of walking the board square by square.
+#
+# Square (x, y) maps to bit x * 8 + y, so iterating the bits from low to high visits squares in
+# the same order as reversi_board._checkValidMoves.
+import json
+from reversi_board import _drawBoard
+from symmetry import canonical_hash
+
+SIZE = 8
+FULL = (1 << 64) - 1
+
+_NOT_Y0 = 0
+_NOT_Y7 = 0
+for _x in range(SIZE):
+    for _y in range(SIZE):
+        if _y != 0:
+            _NOT_Y0 |= 1 << (_x * SIZE + _y)
+        if _y != SIZE - 1:
+            _NOT_Y7 |= 1 << (_x * SIZE + _y)
+
+# (shift, mask) pairs for the 8 directions. A positive shift moves bits towards higher indexes,
+# the mask drops bits that wrapped around from one column of y into the next.
+DIRECTIONS = []
+for _dx, _dy in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
+    if _dy == 1:
+        _mask = _NOT_Y0
+    elif _dy == -1:
+        _mask = _NOT_Y7
+    else:
+        _mask = FULL
+    DIRECTIONS.append((_dx * SIZE + _dy, _mask))
+
+
+class BitReversiBoard:
+
+    def __init__(self, size=8):
+        if size != SIZE:
+            raise ValueError("BitReversiBoard only supports 8x8 boards")
+        mid = SIZE // 2
+        self._x = square_bit(mid-1, mid-1) | square_bit(mid, mid)
+        self._o = square_bit(mid-1, mid) | square_bit(mid, mid-1)
+        # Legal move masks per symbol, computed on first request and dropped whenever the position changes.
+        self._move_masks = {}
+        # Zobrist hashing is off until set_zobrist_keys is called.
+        self._zobrist = None
+        self._hash = 0
+
+    @classmethod
+    def from_board(cls, board):
+        # Builds a bitboard copy of any board exposing get_symbol_for_position.
+        new_board = cls(board.get_size())
+        new_board._x = 0
+        new_board._o = 0
+        new_board._move_masks = {}
+        new_board._zobrist = None
+        new_board._hash = 0
+        for x in range(SIZE):
+            for y in range(SIZE):
+                symbol = board.get_symbol_for_position([x, y])
+                if symbol == 'X':
+                    new_board._x |= square_bit(x, y)
+                elif symbol == 'O':
+                    new_board._o |= square_bit(x, y)
+        return new_board
+
+    def draw_board(self):
+        _drawBoard(self.to_list())
+
+    def is_valid_move(self, symbol, position):
+        x, y = position[0], position[1]
+        if not (0 <= x < SIZE and 0 <= y < SIZE):
+            return False
+        own, opp = self._split(symbol)
+        flips = calc_flips(own, opp, square_bit(x, y))
+        if not flips:
+            return False
+        return bits_to_moves(flips)
+
+    def calc_scores(self):
+        return {'X': popcount(self._x), 'O': popcount(self._o)}
+
+    def make_move(self, symbol, position):
+        # Plays the move in place. Returns False for an invalid move, otherwise an undo record to pass to undo_move.
+        x, y = position[0], position[1]
+        if not (0 <= x < SIZE and 0 <= y < SIZE):
+            return False
+        own, opp = self._split(symbol)
+        move = square_bit(x, y)
+        flips = calc_flips(own, opp, move)
+        if not flips:
+            return False
+        record = (self._x, self._o, self._move_masks, self._hash)
+        own |= move | flips
+        opp ^= flips
+        if symbol == 'X':
+            self._x, self._o = own, opp
+        else:
+            self._o, self._x = own, opp
+        self._move_masks = {}
+        if self._zobrist is not None:
+            x_keys, o_keys, flip_keys = self._zobrist
+            index = move.bit_length() - 1
+            h = self._hash ^ (x_keys[index] if symbol == 'X' else o_keys[index])
+            while flips:
+                low = flips & -flips
+                h ^= flip_keys[low.bit_length() - 1]
+                flips ^= low
+            self._hash = h
+        return record
+
+    def undo_move(self, record):
+        # Restores the board to the position before the make_move call that returned record.
+        self._x, self._o, self._move_masks, self._hash = record
+
+    def set_zobrist_keys(self, keys):
+        # Turns on incremental Zobrist hashing. keys maps (x, y, is_x) to a random 64-bit integer.
+        x_keys = [keys[(i // SIZE, i % SIZE, True)] for i in range(SIZE * SIZE)]
+        o_keys = [keys[(i // SIZE, i % SIZE, False)] for i in range(SIZE * SIZE)]
+        flip_keys = [x_keys[i] ^ o_keys[i] for i in range(SIZE * SIZE)]
+        self._zobrist = (x_keys, o_keys, flip_keys)
+        h = 0
+        for i in range(SIZE * SIZE):
+            if self._x >> i & 1:
+                h ^= x_keys[i]
+            elif self._o >> i & 1:
+                h ^= o_keys[i]
+        self._hash = h
+
+    def get_hash(self):
+        return self._hash
+
+    def canonical_hash(self):
+        # Returns a key shared by every rotation and reflection of the position, and the symmetry that maps
+        # this board onto the orientation the key was taken in (see symmetry.py).
+        return canonical_hash(self._x, self._o)
+
+    def calc_valid_moves(self, symbol):
+        return bits_to_moves(self.calc_move_mask(symbol))
+
+    def calc_move_mask(self, symbol):
+        # Returns the legal moves for symbol as a bitboard.
+        mask = self._move_masks.get(symbol)
+        if mask is None:
+            own, opp = self._split(symbol)
+            mask = calc_move_mask(own, opp)
+            self._move_masks[symbol] = mask
+        return mask
+
+    def game_continues(self):
+        return self.calc_move_mask('X') != 0 or self.calc_move_mask('O') != 0
+
+    def get_size(self):
+        return SIZE
+
+    def get_symbol_for_position(self, position):
+        bit = square_bit(position[0], position[1])
+        if self._x & bit:
+            return 'X'
+        if self._o & bit:
+            return 'O'
+        return ' '
+
+    def get_opponent_symbol(self, symbol):
+        if symbol == 'X':
+            return 'O'
+        else:
+            return 'X'
+
+    def get_bitboards(self):
+        # Returns the (X, O) bitboards.
+        return self._x, self._o
+
+    def copy(self):
+        new_board = BitReversiBoard.__new__(BitReversiBoard)
+        new_board._x = self._x
+        new_board._o = self._o
+        new_board._move_masks = dict(self._move_masks)
+        new_board._zobrist = self._zobrist
+        new_board._hash = self._hash
+        return new_board
+
+    def to_list(self):
+        return [[self.get_symbol_for_position([x, y]) for y in range(SIZE)] for x in range(SIZE)]
+
+    def to_json_file(self, filename):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.to_list(), f, ensure_ascii=False)
+
+    def _split(self, symbol):
+        # Returns (own, opponent) bitboards for the given symbol.
+        if symbol == 'X':
+            return self._x, self._o
+        return self._o, self._x
+
+
+def square_bit(x, y):
+    return 1 << (x * SIZE + y)
+
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+def bits_to_moves(bits):
+    # Returns the [x, y] squares of every set bit, lowest index first.
+    moves = []
+    while bits:
+        low = bits & -bits
+        index = low.bit_length() - 1
+        moves.append([index // SIZE, index % SIZE])
+        bits ^= low
+    return moves
+
+
+def calc_move_mask(own, opp):
+    # Returns a bitboard of every empty square where own can play.
+    empty = ~(own | opp) & FULL
+    moves = 0
+    for shift, mask in DIRECTIONS:
+        if shift > 0:
+            t = (own << shift) & mask & opp
+            t |= (t << shift) & mask & opp
+            t |= (t << shift) & mask & opp
+            t |= (t << shift) & mask & opp
+            t |= (t << shift) & mask & opp
+            t |= (t << shift) & mask & opp
+            moves |= (t << shift) & mask & empty
+        else:
+            shift = -shift
+            t = (own >> shift) & mask & opp
+            t |= (t >> shift) & mask & opp
+            t |= (t >> shift) & mask & opp
+            t |= (t >> shift) & mask & opp
+            t |= (t >> shift) & mask & opp
+            t |= (t >> shift) & mask & opp
+            moves |= (t >> shift) & mask & empty
+    return moves
+
+
+def calc_flips(own, opp, move):
+    # Returns the bitboard of discs flipped when own plays on the single-bit square move,
+    # or 0 when the move is illegal.
+    if (own | opp) & move:
+        return 0
+    flips = 0
+    for shift, mask in DIRECTIONS:
+        line = 0
+        if shift > 0:
+            cur = (move << shift) & mask
+            while cur & opp:
+                line |= cur
+                cur = (cur << shift) & mask
+        else:
+            cur = (move >> -shift) & mask
+            while cur & opp:
+                line |= cur
+                cur = (cur >> -shift) & mask
+        if cur & own:
+            flips |= line
+    return flips
@@ -1,11 +1,27 @@
 # adapted by Toby Dragon from original source code by Al Sweigart, available with creative commons license: https://inventwithpython.com/#donate
 import json
 import random
+from symmetry import canonical_hash_of_list
 
 class ReversiBoard:
 
     def __init__(self, size=8):
         self._board = _getNewBoard(size)
+        # Piece counts are kept up to date by make_move/undo_move, legal moves are computed on
+        # first request and dropped whenever the position changes.
+        self._scores = _getScoreOfBoard(self._board)
+        self._valid_moves = {}
+        # Zobrist hashing is off until set_zobrist_keys is called.
+        self._zobrist = None
+        self._hash = 0
+
+    @classmethod
+    def from_rows(cls, rows):
+        # Builds a board from a list of lists of 'X', 'O' and ' ', as get_symbol_for_position reads them.
+        new_board = cls(len(rows))
+        new_board._board = [list(row) for row in rows]
+        new_board._scores = _getScoreOfBoard(new_board._board)
+        return new_board
 
     def draw_board(self):
         _drawBoard(self._board)
@@ -14,17 +30,53 @@ class ReversiBoard:
         return _isValidMove(self._board, symbol, position[0], position[1])
 
     def calc_scores(self):
-        return _getScoreOfBoard(self._board)
+        return {'X': self._scores['X'], 'O': self._scores['O']}
 
     def make_move(self, symbol, position):
-        return _makeMove(self._board, symbol, position[0], position[1])
+        # Plays the move in place. Returns False for an invalid move, otherwise an undo record to pass to undo_move.
+        flipped = _makeMove(self._board, symbol, position[0], position[1])
+        if flipped == False:
+            return False
+        record = (symbol, (position[0], position[1]), flipped, self._scores, self._valid_moves, self._hash)
+        self._scores = {symbol: self._scores[symbol] + len(flipped) + 1,
+                        self.get_opponent_symbol(symbol): self._scores[self.get_opponent_symbol(symbol)] - len(flipped)}
+        self._valid_moves = {}
+        if self._zobrist is not None:
+            keys = self._zobrist
+            h = self._hash ^ keys[(position[0], position[1], symbol == 'X')]
+            for x, y in flipped:
+                h ^= keys[(x, y, True)] ^ keys[(x, y, False)]
+            self._hash = h
+        return record
+
+    def undo_move(self, record):
+        # Restores the board to the position before the make_move call that returned record.
+        symbol, position, flipped, self._scores, self._valid_moves, self._hash = record
+        _undoMove(self._board, symbol, position, flipped)
+
+    def set_zobrist_keys(self, keys):
+        # Turns on incremental Zobrist hashing. keys maps (x, y, is_x) to a random 64-bit integer.
+        self._zobrist = keys
+        self._hash = _getZobristHash(self._board, keys)
+
+    def get_hash(self):
+        return self._hash
+
+    def canonical_hash(self):
+        # Returns a key shared by every rotation and reflection of the position, and the symmetry that maps
+        # this board onto the orientation the key was taken in (see symmetry.py).
+        return canonical_hash_of_list(self._board)
 
     def calc_valid_moves(self, symbol):
-        moves = _checkValidMoves(self._board, symbol)
-        return moves
+        moves = self._valid_moves.get(symbol)
+        if moves is None:
+            moves = _checkValidMoves(self._board, symbol)
+            self._valid_moves[symbol] = moves
+        # callers are free to reorder the list they get back
+        return list(moves)
 
     def game_continues(self):
-        return self.calc_valid_moves("X") != [] or self.calc_valid_moves("O") != []
+        return self._has_moves('X') or self._has_moves('O')
 
     def get_size(self):
         return len(self._board)
@@ -38,6 +90,22 @@ class ReversiBoard:
         else:
             return 'X'
 
+    def copy(self):
+        new_board = ReversiBoard.__new__(ReversiBoard)
+        new_board._board = [column[:] for column in self._board]
+        new_board._scores = self._scores
+        new_board._valid_moves = dict(self._valid_moves)
+        new_board._zobrist = self._zobrist
+        new_board._hash = self._hash
+        return new_board
+
+    def _has_moves(self, symbol):
+        moves = self._valid_moves.get(symbol)
+        if moves is None:
+            moves = _checkValidMoves(self._board, symbol)
+            self._valid_moves[symbol] = moves
+        return moves != []
+
     def to_json_file(self, filename):
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(self._board, f, ensure_ascii=False)
@@ -125,7 +193,7 @@ def _isValidMove(board, tile, xstart, ystart):
 
 def _makeMove(board, tile, xstart, ystart):
     # Place the tile on the board at xstart, ystart, and flip any of the opponent's pieces.
-    # Returns False if this is an invalid move, True if it is valid.
+    # Returns False if this is an invalid move, otherwise the list of flipped tiles.
     tilesToFlip = _isValidMove(board, tile, xstart, ystart)
 
     if tilesToFlip == False:
@@ -134,7 +202,17 @@ def _makeMove(board, tile, xstart, ystart):
     board[xstart][ystart] = tile
     for x, y in tilesToFlip:
         board[x][y] = tile
-    return True
+    return tilesToFlip
+
+def _undoMove(board, tile, position, tilesToFlip):
+    # Takes back a move made by _makeMove: empties the placed tile and flips the captured ones back.
+    if tile == 'X':
+        otherTile = 'O'
+    else:
+        otherTile = 'X'
+    board[position[0]][position[1]] = ' '
+    for x, y in tilesToFlip:
+        board[x][y] = otherTile
 
 def _checkValidMoves(board, tile):
     # Returns a list of [x,y] lists of valid moves for the given player on the given board.
@@ -145,6 +223,15 @@ def _checkValidMoves(board, tile):
                 validMoves.append([x, y])
     return validMoves
 
+def _getZobristHash(board, keys):
+    # XORs together the keys of every occupied square.
+    h = 0
+    for x in range(len(board)):
+        for y in range(len(board)):
+            if board[x][y] != ' ':
+                h ^= keys[(x, y, board[x][y] == 'X')]
+    return h
+
 def _getScoreOfBoard(board):
     # Determine the score by counting the tiles. Returns a dictionary with keys 'X' and 'O'.
     xscore = 0
@@ -1,32 +1,56 @@
 # Written by Toby Dragon
 
-import copy
+import json
 from datetime import datetime
 from reversi_board import ReversiBoard
+from reversi_bitboard import BitReversiBoard
+from reversi_generic_bitboard import GenericBitReversiBoard
 from player1.all_players import *
-from os import getcwd
+from simulator import GameRecord, pass_code, new_moves, frozen_moves
+from game_records import GameRecordWriter
 
 
 class ReversiGame:
 
-    def __init__(self, player1, player2, show_status=True, board_size=8, board_filename=None):
+    def __init__(self, player1, player2, show_status=True, board_size=8, board_filename=None, board_class=None,
+                 autoplay=True, record_path=None):
         self.player1 = player1
         self.player2 = player2
         self.show_status = show_status
         if board_filename is None:
-            self.board = ReversiBoard(board_size)
+            self.board = _default_board_class(board_size, board_class)(board_size)
         else:
-            self.board = ReversiBoard(board_filename=board_filename)
+            if record_path is not None:
+                raise ValueError("games starting from a saved board can't be recorded, records replay from the start")
+            # a board saved with to_json_file
+            with open(board_filename, encoding='utf-8') as f:
+                self.board = ReversiBoard.from_rows(json.load(f))
+            board_class = _default_board_class(self.board.get_size(), board_class)
+            if board_class is not ReversiBoard:
+                self.board = board_class.from_board(self.board)
+        # the moves played, encoded like simulator.GameRecord, where X plays the even plies, so a game O
+        # starts begins with a pass; with record_path set the finished game is appended to that game
+        # record file (see game_records.py)
+        size = self.board.get_size()
+        self.moves = new_moves(size, [pass_code(size)] if player1.symbol == 'O' else [])
+        self.record_path = record_path
         self.decision_times = {self.player1.symbol: 0, self.player2.symbol: 0}
         self.moves_made = {self.player1.symbol: 0, self.player2.symbol: 0}
         self.max_decision_time = {self.player1.symbol: 0, self.player2.symbol: 0}
-        self.play_game()
+        if autoplay:
+            self.play_game()
 
     def play_game(self):
         if self.show_status:
             self.board.draw_board()
         while self.board.game_continues():
             self.play_round()
+        for player in (self.player1, self.player2):
+            if hasattr(player, 'stop_pondering'):
+                player.stop_pondering()
+        if self.record_path is not None:
+            with GameRecordWriter(self.record_path, self.board.get_size()) as writer:
+                writer.write(self.get_record())
         if self.show_status:
             print("Game over, Final Scores:")
             print_scores(self.board.calc_scores())
@@ -34,15 +58,15 @@ class ReversiGame:
     def play_round(self):
         start = datetime.now()
         self.play_move(self.player1)
-        self.decision_times[self.player1.symbol] += (datetime.now()-start).total_seconds()
         move_time = (datetime.now()-start).total_seconds()
+        self.decision_times[self.player1.symbol] += move_time
         if move_time > 2.7:
             print("BEEG MOVE",move_time)
         self.max_decision_time[self.player1.symbol] = move_time if move_time > self.max_decision_time[self.player1.symbol] else self.max_decision_time[self.player1.symbol]
         start = datetime.now()
         self.play_move(self.player2)
-        self.decision_times[self.player2.symbol] += (datetime.now()-start).total_seconds()
         move_time = (datetime.now()-start).total_seconds()
+        self.decision_times[self.player2.symbol] += move_time
         if move_time > 2.7:
             print("BEEG MOVE",move_time)
         self.max_decision_time[self.player2.symbol] = move_time if move_time > self.max_decision_time[self.player2.symbol] else self.max_decision_time[self.player2.symbol]
@@ -52,14 +76,23 @@ class ReversiGame:
     def play_move(self, player):
         if self.board.calc_valid_moves(player.symbol):
             self.moves_made[player.symbol] += 1
-            chosen_move = player.get_move(copy.deepcopy(self.board))
+            chosen_move = player.get_move(self.board.copy())
             if not self.board.make_move(player.symbol, chosen_move):
                 print("Error: invalid move made")
-            elif self.show_status:
+                # the turn is lost: recorded as a pass so every later move stays on its side's ply
+                self.moves.append(pass_code(self.board.get_size()))
+                return
+            self.moves.append(chosen_move[0] * self.board.get_size() + chosen_move[1])
+            # players that search on the opponent's time start doing so now
+            if hasattr(player, 'ponder'):
+                player.ponder(self.board.copy())
+            if self.show_status:
                 self.board.draw_board()
                 print_scores(self.board.calc_scores())
-        elif self.show_status:
-            print(player.symbol, "can't move.")
+        elif self.board.game_continues():
+            self.moves.append(pass_code(self.board.get_size()))
+            if self.show_status:
+                print(player.symbol, "can't move.")
 
     def calc_winner(self):
         scores = self.board.calc_scores()
@@ -73,6 +106,18 @@ class ReversiGame:
     def get_decision_times(self):
         return self.decision_times
 
+    def get_record(self):
+        # The game so far as a GameRecord, X having played the even plies.
+        return GameRecord(frozen_moves(self.moves), self.board.calc_scores())
+
+
+def _default_board_class(size, board_class):
+    # Bitboards unless another board is asked for: the endgame solver and the stability and pattern
+    # evaluations work on bitboards, and would otherwise convert or be skipped.
+    if board_class is not None:
+        return board_class
+    return BitReversiBoard if size == 8 else GenericBitReversiBoard
+
 
 def print_scores(score_map):
     for symbol in score_map:
@@ -81,52 +126,20 @@ def print_scores(score_map):
 
 
 def compare_players(player1, player2, games):
-    game_count_map = {player1.symbol: 0, player2.symbol: 0, "TIE": 0}
-    time_elapsed_map = {player1.symbol: 0, player2.symbol: 0}
-    average_scores = {player1.symbol: 0, player2.symbol: 0}
-    average_move_time = {player1.symbol: 0, player2.symbol: 0}
-    moves = {player1.symbol:0, player2.symbol:0}
-    max_decision_time = {player1.symbol: 0, player2.symbol: 0}
-    for i in range(0, games):
-        if i % 10 == 0:
-            print(i, "games finished")
-        if i % 2 == 0:
-            game = ReversiGame(player1, player2, show_status=False, board_size=8)
-        else:
-            game = ReversiGame(player2, player1, show_status=False, board_size=8)
-
-        #print(player1.turn_number)
-
-        game_count_map[game.calc_winner()] += 1
-        decision_times = game.get_decision_times()
-        average_scores[player1.symbol] += game.board.calc_scores()[player1.symbol]
-        average_scores[player2.symbol] += game.board.calc_scores()[player2.symbol]
-
-        max_decision_time[player1.symbol] = game.max_decision_time[player1.symbol] if game.max_decision_time[player1.symbol] > max_decision_time[player1.symbol] else max_decision_time[player1.symbol]
-        max_decision_time[player2.symbol] = game.max_decision_time[player2.symbol] if game.max_decision_time[player2.symbol] > max_decision_time[player2.symbol] else max_decision_time[player2.symbol]
-
-        for symbol in decision_times:
-            time_elapsed_map[symbol] += decision_times[symbol]
-            average_move_time[symbol] += (decision_times[symbol] / game.moves_made[symbol])
-            moves[symbol] += game.moves_made[symbol]
-
-        player2.write_tras_lookup(getcwd() + '/player1/trans_table.pickle', getcwd() + '/player1/lookup.pickle')
-
-    average_scores[player1.symbol] = average_scores[player1.symbol]/games
-    average_scores[player2.symbol] = average_scores[player2.symbol]/games
-    print(game_count_map)
-    print(average_scores)
-    for symbol in ["X", 'O']:
-        t = time_elapsed_map[symbol] / moves[symbol]
-        print(symbol+" average decision time: ", t)
-
-    print("Highest Decision Times: ", max_decision_time)
+    from tournament import play_games, summarize, print_summary
+    results = []
+    for result in play_games(lambda symbol: player1, lambda symbol: player2, games, names=(player1.symbol, player2.symbol)):
+        if len(results) % 10 == 0:
+            print(len(results), "games finished")
+        results.append(result)
+    print_summary(summarize(results))
+    player2.flush_trans_table()
 
 
 def main():
     player2 = get_combined_player('X', depth=8, change=True)
     player1 = get_combined_player('O', depth=7, change=False)
-    game = ReversiGame(player1, player2, show_status=False)
+    game = ReversiGame(player1, player2, show_status=False, board_class=BitReversiBoard)
     print(game.max_decision_time)
     print("Total Moves made by each player: "+ "X: "+ str(game.moves_made['X']) + " O: "+str(game.moves_made['O']))
     for player in ['X', 'O']:
@@ -135,7 +148,7 @@ def main():
         average = time/moves
         print("Average Decision Time For Player "+player+": "+str(average))
     print(game.board.calc_scores())
-    player2.write_tras_lookup(getcwd() + '/player1/trans_table.pickle', getcwd() + '/player1/lookup.pickle')
+    player2.flush_trans_table()
 
     # compare_players(player1, player2, 100)
 
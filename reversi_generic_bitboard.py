@@ -0,0 +1,309 @@
+# Bitboard backend for boards of any even size from 4x4 to 16x16. Exposes the same public interface as
+# ReversiBoard, with the position kept as two Python integers of size * size bits, one per player.
+#
+# Square (x, y) maps to bit x * size + y, the layout of reversi_bitboard stretched to the board size, so
+# an 8x8 GenericBitReversiBoard holds the same bitboards as a BitReversiBoard. Moves and flips are
+# generated with the same shift-and-mask steps; the masks come from a BoardGeometry built once per size,
+# and a ray is followed only as long as it still has discs on it instead of a fixed six steps.
+#
+# The 8x8-only parts of the engine (endgame solver, edge stability tables, patterns) look for
+# get_bitboards, which this class leaves out, so they never see a board they weren't built for.
+import json
+from reversi_board import _drawBoard
+from reversi_bitboard import popcount
+from symmetry import canonical_hash_of_bits
+
+MIN_SIZE = 4
+MAX_SIZE = 16
+
+# the eight directions as (dx, dy), in the order reversi_board._isValidMove walks them
+_STEPS = [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]
+
+
+class BoardGeometry:
+    # The masks the bit operations of one board size need.
+
+    def __init__(self, size):
+        self.size = size
+        self.full = (1 << (size * size)) - 1
+        not_first_y = 0
+        not_last_y = 0
+        for x in range(size):
+            for y in range(size):
+                if y != 0:
+                    not_first_y |= 1 << (x * size + y)
+                if y != size - 1:
+                    not_last_y |= 1 << (x * size + y)
+        # (shift, mask) pairs like reversi_bitboard.DIRECTIONS: a positive shift moves bits towards higher
+        # indexes, the mask drops bits that wrapped from one column of y into the next or off the board
+        self.directions = []
+        for dx, dy in _STEPS:
+            if dy == 1:
+                mask = not_first_y
+            elif dy == -1:
+                mask = not_last_y
+            else:
+                mask = self.full
+            self.directions.append((dx * size + dy, mask))
+        # for each direction, the squares whose neighbour that way is off the board
+        self.edges = []
+        for dx, dy in _STEPS:
+            edge = 0
+            for x in range(size):
+                for y in range(size):
+                    if not (0 <= x + dx < size and 0 <= y + dy < size):
+                        edge |= 1 << (x * size + y)
+            self.edges.append(edge)
+
+
+_geometries = {}
+
+
+def geometry(size):
+    # Returns the BoardGeometry of a board size, built on first use.
+    g = _geometries.get(size)
+    if g is None:
+        if size % 2 or not MIN_SIZE <= size <= MAX_SIZE:
+            raise ValueError("GenericBitReversiBoard supports even sizes from %d to %d" % (MIN_SIZE, MAX_SIZE))
+        g = BoardGeometry(size)
+        _geometries[size] = g
+    return g
+
+
+class GenericBitReversiBoard:
+
+    def __init__(self, size=8):
+        self._geometry = geometry(size)
+        self._size = size
+        mid = size // 2
+        self._x = 1 << ((mid-1) * size + mid-1) | 1 << (mid * size + mid)
+        self._o = 1 << ((mid-1) * size + mid) | 1 << (mid * size + mid-1)
+        # Legal move masks per symbol, computed on first request and dropped whenever the position changes.
+        self._move_masks = {}
+        # Zobrist hashing is off until set_zobrist_keys is called.
+        self._zobrist = None
+        self._hash = 0
+
+    @classmethod
+    def from_board(cls, board):
+        # Builds a bitboard copy of any board exposing get_symbol_for_position.
+        size = board.get_size()
+        new_board = cls(size)
+        new_board._x = 0
+        new_board._o = 0
+        for x in range(size):
+            for y in range(size):
+                symbol = board.get_symbol_for_position([x, y])
+                if symbol == 'X':
+                    new_board._x |= 1 << (x * size + y)
+                elif symbol == 'O':
+                    new_board._o |= 1 << (x * size + y)
+        return new_board
+
+    @classmethod
+    def from_rows(cls, rows):
+        # Builds a board from a list of lists of 'X', 'O' and ' ', as get_symbol_for_position reads them.
+        size = len(rows)
+        new_board = cls(size)
+        new_board._x = 0
+        new_board._o = 0
+        for x in range(size):
+            for y in range(size):
+                if rows[x][y] == 'X':
+                    new_board._x |= 1 << (x * size + y)
+                elif rows[x][y] == 'O':
+                    new_board._o |= 1 << (x * size + y)
+        return new_board
+
+    def draw_board(self):
+        _drawBoard(self.to_list())
+
+    def is_valid_move(self, symbol, position):
+        x, y = position[0], position[1]
+        size = self._size
+        if not (0 <= x < size and 0 <= y < size):
+            return False
+        own, opp = self._split(symbol)
+        flips = calc_flips(own, opp, 1 << (x * size + y), self._geometry)
+        if not flips:
+            return False
+        return bits_to_moves(flips, size)
+
+    def calc_scores(self):
+        return {'X': popcount(self._x), 'O': popcount(self._o)}
+
+    def make_move(self, symbol, position):
+        # Plays the move in place. Returns False for an invalid move, otherwise an undo record to pass to undo_move.
+        x, y = position[0], position[1]
+        size = self._size
+        if not (0 <= x < size and 0 <= y < size):
+            return False
+        own, opp = self._split(symbol)
+        index = x * size + y
+        move = 1 << index
+        flips = calc_flips(own, opp, move, self._geometry)
+        if not flips:
+            return False
+        record = (self._x, self._o, self._move_masks, self._hash)
+        own |= move | flips
+        opp ^= flips
+        if symbol == 'X':
+            self._x, self._o = own, opp
+        else:
+            self._o, self._x = own, opp
+        self._move_masks = {}
+        if self._zobrist is not None:
+            x_keys, o_keys, flip_keys = self._zobrist
+            h = self._hash ^ (x_keys[index] if symbol == 'X' else o_keys[index])
+            while flips:
+                low = flips & -flips
+                h ^= flip_keys[low.bit_length() - 1]
+                flips ^= low
+            self._hash = h
+        return record
+
+    def undo_move(self, record):
+        # Restores the board to the position before the make_move call that returned record.
+        self._x, self._o, self._move_masks, self._hash = record
+
+    def set_zobrist_keys(self, keys):
+        # Turns on incremental Zobrist hashing. keys maps (x, y, is_x) to a random 64-bit integer.
+        size = self._size
+        x_keys = [keys[(i // size, i % size, True)] for i in range(size * size)]
+        o_keys = [keys[(i // size, i % size, False)] for i in range(size * size)]
+        flip_keys = [x_keys[i] ^ o_keys[i] for i in range(size * size)]
+        self._zobrist = (x_keys, o_keys, flip_keys)
+        h = 0
+        for i in range(size * size):
+            if self._x >> i & 1:
+                h ^= x_keys[i]
+            elif self._o >> i & 1:
+                h ^= o_keys[i]
+        self._hash = h
+
+    def get_hash(self):
+        return self._hash
+
+    def canonical_hash(self):
+        # Returns a key shared by every rotation and reflection of the position, and the symmetry that maps
+        # this board onto the orientation the key was taken in (see symmetry.py).
+        return canonical_hash_of_bits(self._x, self._o, self._size)
+
+    def calc_valid_moves(self, symbol):
+        return bits_to_moves(self.calc_move_mask(symbol), self._size)
+
+    def calc_move_mask(self, symbol):
+        # Returns the legal moves for symbol as a bitboard.
+        mask = self._move_masks.get(symbol)
+        if mask is None:
+            own, opp = self._split(symbol)
+            mask = calc_move_mask(own, opp, self._geometry)
+            self._move_masks[symbol] = mask
+        return mask
+
+    def game_continues(self):
+        return self.calc_move_mask('X') != 0 or self.calc_move_mask('O') != 0
+
+    def get_size(self):
+        return self._size
+
+    def get_symbol_for_position(self, position):
+        bit = 1 << (position[0] * self._size + position[1])
+        if self._x & bit:
+            return 'X'
+        if self._o & bit:
+            return 'O'
+        return ' '
+
+    def get_opponent_symbol(self, symbol):
+        if symbol == 'X':
+            return 'O'
+        else:
+            return 'X'
+
+    def get_sized_bitboards(self):
+        # Returns the (X, O) bitboards, square (x, y) on bit x * size + y.
+        return self._x, self._o
+
+    def copy(self):
+        new_board = GenericBitReversiBoard.__new__(GenericBitReversiBoard)
+        new_board._geometry = self._geometry
+        new_board._size = self._size
+        new_board._x = self._x
+        new_board._o = self._o
+        new_board._move_masks = dict(self._move_masks)
+        new_board._zobrist = self._zobrist
+        new_board._hash = self._hash
+        return new_board
+
+    def to_list(self):
+        size = self._size
+        return [[self.get_symbol_for_position([x, y]) for y in range(size)] for x in range(size)]
+
+    def to_json_file(self, filename):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.to_list(), f, ensure_ascii=False)
+
+    def _split(self, symbol):
+        # Returns (own, opponent) bitboards for the given symbol.
+        if symbol == 'X':
+            return self._x, self._o
+        return self._o, self._x
+
+
+def bits_to_moves(bits, size):
+    # Returns the [x, y] squares of every set bit, lowest index first.
+    moves = []
+    while bits:
+        low = bits & -bits
+        index = low.bit_length() - 1
+        moves.append([index // size, index % size])
+        bits ^= low
+    return moves
+
+
+def calc_move_mask(own, opp, g):
+    # Returns a bitboard of every empty square where own can play, g being the board's BoardGeometry.
+    empty = ~(own | opp) & g.full
+    moves = 0
+    for shift, mask in g.directions:
+        line_mask = mask & opp
+        if shift > 0:
+            front = (own << shift) & line_mask
+            t = front
+            while front:
+                front = (front << shift) & line_mask
+                t |= front
+            moves |= (t << shift) & mask & empty
+        else:
+            shift = -shift
+            front = (own >> shift) & line_mask
+            t = front
+            while front:
+                front = (front >> shift) & line_mask
+                t |= front
+            moves |= (t >> shift) & mask & empty
+    return moves
+
+
+def calc_flips(own, opp, move, g):
+    # Returns the bitboard of discs flipped when own plays on the single-bit square move,
+    # or 0 when the move is illegal.
+    if (own | opp) & move:
+        return 0
+    flips = 0
+    for shift, mask in g.directions:
+        line = 0
+        if shift > 0:
+            cur = (move << shift) & mask
+            while cur & opp:
+                line |= cur
+                cur = (cur << shift) & mask
+        else:
+            cur = (move >> -shift) & mask
+            while cur & opp:
+                line |= cur
+                cur = (cur >> -shift) & mask
+        if cur & own:
+            flips |= line
+    return flips
@@ -1,6 +1,5 @@
 # adapted by Toby Dragon from original source code by Al Sweigart, available with creative commons license: https://inventwithpython.com/#donate
 import random
-import copy
 from collections import deque
 import heapq
 
@@ -46,13 +45,12 @@ class GreedyComputerPlayer:
 
     # Super simple move decision that will always make move that gives highest score
     def get_move(self, board):
-        # copy.deepcopy(self.board)
         possible = board.calc_valid_moves(self.symbol)
         moves = []
         for p in possible:
-            board_copy = copy.deepcopy(board)
-            board_copy.make_move(symbol=self.symbol, position=p)
-            score = board_copy.calc_scores()[self.symbol]
+            record = board.make_move(symbol=self.symbol, position=p)
+            score = board.calc_scores()[self.symbol]
+            board.undo_move(record)
             heapq.heappush(moves, (score, p))
 
         to_make = moves.pop()
@@ -76,9 +74,9 @@ class MiniMaxComputerPlayer:
         best_move = possible_moves[0]
         best_score = float('-inf')
         for move in possible_moves:
-            bc = copy.deepcopy(board)
-            bc.make_move(self.symbol, move)
-            score = self.min_play(bc, 1)
+            record = board.make_move(self.symbol, move)
+            score = self.min_play(board, 1)
+            board.undo_move(record)
             if score > best_score:
                 best_move = move
                 best_score = score
@@ -92,9 +90,9 @@ class MiniMaxComputerPlayer:
         possible_moves = board.calc_valid_moves(sym)
         best_score = float('inf')
         for move in possible_moves:
-            bc = copy.deepcopy(board)
-            bc.make_move(sym, move)
-            score = self.max_play(bc, depth+1)
+            record = board.make_move(sym, move)
+            score = self.max_play(board, depth+1)
+            board.undo_move(record)
             if score < best_score:
                 best_move = move
                 best_score = score
@@ -106,9 +104,9 @@ class MiniMaxComputerPlayer:
         possible_moves = board.calc_valid_moves(self.symbol)
         best_score = float('-inf')
         for move in possible_moves:
-            bc = copy.deepcopy(board)
-            bc.make_move(self.symbol, move)
-            score = self.min_play(bc, depth+1)
+            record = board.make_move(self.symbol, move)
+            score = self.min_play(board, depth+1)
+            board.undo_move(record)
             if score > best_score:
                 best_move = move
                 best_score = score
@@ -0,0 +1,86 @@
+# Headless game simulator for self-play and data generation.
+#
+# Plays many games side by side, one ply of every game at a time, without drawing, timing or copying
+# boards. Each game comes back as a GameRecord holding its moves as bytes and its final scores.
+# A move on square (x, y) is stored as the byte x * size + y, a pass as PASS, so X always plays the
+# even plies and O the odd ones. A 16x16 board has more squares than fit below PASS, so its moves are
+# kept as an array of uint16 instead, with WIDE_PASS for a pass.
+import random
+from array import array
+from collections import namedtuple
+from reversi_bitboard import BitReversiBoard
+
+PASS = 255
+WIDE_PASS = 0xFFFF
+
+GameRecord = namedtuple('GameRecord', ['moves', 'scores'])
+
+
+def simulate_games(player_x, player_o, games, board_class=BitReversiBoard, seed=None, record=None):
+    '''
+    Plays games between two players in lockstep
+    :param player_x: the player for X, who moves first
+    :param player_o: the player for O
+    :param games: number of games to play
+    :param seed: optional seed for the random module, for reproducible random and greedy playouts
+    :param record: optional path of a game record file to append the games to (see game_records.py)
+    :return: a GameRecord for each game
+    '''
+    if seed is not None:
+        random.seed(seed)
+    players = {'X': player_x, 'O': player_o}
+    boards = [board_class() for _ in range(games)]
+    size = boards[0].get_size() if games else 0
+    moves = [new_moves(size) for _ in range(games)]
+    pass_move = pass_code(size)
+    active = list(range(games))
+    symbol = 'X'
+    while active:
+        player = players[symbol]
+        still_playing = []
+        for i in active:
+            board = boards[i]
+            if not board.game_continues():
+                continue
+            if board.calc_valid_moves(symbol):
+                # players get the live board: make/undo searches leave it as they found it
+                move = player.get_move(board)
+                board.make_move(symbol, move)
+                moves[i].append(move[0] * size + move[1])
+            else:
+                moves[i].append(pass_move)
+            still_playing.append(i)
+        active = still_playing
+        symbol = 'O' if symbol == 'X' else 'X'
+    records = [GameRecord(frozen_moves(moves[i]), boards[i].calc_scores()) for i in range(games)]
+    if record is not None and records:
+        from game_records import write_records
+        write_records(record, records, size)
+    return records
+
+
+def is_wide(size):
+    # Whether the moves of games on a board of size need more than a byte each.
+    return size * size > PASS
+
+
+def pass_code(size):
+    # The encoded pass of games on a board of size.
+    return WIDE_PASS if is_wide(size) else PASS
+
+
+def new_moves(size, moves=()):
+    # A sequence of encoded moves to append to while a game on a board of size is played.
+    return array('H', moves) if is_wide(size) else bytearray(moves)
+
+
+def frozen_moves(moves):
+    # The moves of a finished game as a GameRecord keeps them, bytes or an array of uint16.
+    return array('H', moves) if isinstance(moves, array) else bytes(moves)
+
+
+def decode_move(move, size=8):
+    # Returns the [x, y] square of an encoded move, or None for a pass.
+    if move == pass_code(size):
+        return None
+    return [move // size, move % size]
@@ -0,0 +1,169 @@
+# The 8 rotations and reflections of the board.
+#
+# Symmetry t (0-7) is applied in three steps: bit 2 transposes the board, then bit 0 mirrors x and bit 1
+# mirrors y. Every position has a canonical orientation, the one whose (X, O) bitboards compare smallest,
+# so symmetric copies of a position get the same canonical_hash and can share transposition table and
+# opening book entries. Moves found in the canonical orientation are mapped back with inverse_transform.
+#
+# Bitboards use the layout of reversi_bitboard, square (x, y) on bit x * 8 + y, so mirroring x swaps the
+# bytes, mirroring y reverses the bits inside each byte and transposing is the usual three delta swaps.
+SIZE = 8
+
+_MASK64 = (1 << 64) - 1
+
+
+def transform(t, x, y, size):
+    # Applies symmetry t to square (x, y).
+    if t & 4:
+        x, y = y, x
+    if t & 1:
+        x = size - 1 - x
+    if t & 2:
+        y = size - 1 - y
+    return x, y
+
+
+def inverse_transform(t, x, y, size):
+    if t & 1:
+        x = size - 1 - x
+    if t & 2:
+        y = size - 1 - y
+    if t & 4:
+        x, y = y, x
+    return x, y
+
+
+def transform_move(t, move, size=SIZE):
+    # Maps a move on the board to the canonical orientation, as an (x, y) tuple like the transposition table keeps.
+    return transform(t, move[0], move[1], size)
+
+
+def inverse_transform_move(t, move, size=SIZE):
+    # Maps a move from the canonical orientation back onto the board.
+    return inverse_transform(t, move[0], move[1], size)
+
+
+def mirror_x(bits):
+    return int.from_bytes(bits.to_bytes(8, 'little'), 'big')
+
+
+def mirror_y(bits):
+    bits = (bits >> 1) & 0x5555555555555555 | (bits & 0x5555555555555555) << 1
+    bits = (bits >> 2) & 0x3333333333333333 | (bits & 0x3333333333333333) << 2
+    return (bits >> 4) & 0x0F0F0F0F0F0F0F0F | (bits & 0x0F0F0F0F0F0F0F0F) << 4
+
+
+def transpose(bits):
+    t = 0x0F0F0F0F00000000 & (bits ^ (bits << 28))
+    bits ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (bits ^ (bits << 14))
+    bits ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (bits ^ (bits << 7))
+    return bits ^ t ^ (t >> 7)
+
+
+def transform_bits(t, bits):
+    # Applies symmetry t to a bitboard.
+    if t & 4:
+        bits = transpose(bits)
+    if t & 1:
+        bits = mirror_x(bits)
+    if t & 2:
+        bits = mirror_y(bits)
+    return bits
+
+
+def canonical_bitboards(x_bits, o_bits):
+    '''
+    Finds the canonical orientation of a position
+    :param x_bits: bitboard of X's discs
+    :param o_bits: bitboard of O's discs
+    :return: the X and O bitboards in the canonical orientation, and the symmetry that maps the position onto it
+    '''
+    best = (x_bits, o_bits)
+    best_t = 0
+    for base_t, x, o in ((0, x_bits, o_bits), (4, transpose(x_bits), transpose(o_bits))):
+        mx, mo = mirror_x(x), mirror_x(o)
+        for t, candidate in ((base_t, (x, o)), (base_t | 1, (mx, mo)),
+                             (base_t | 2, (mirror_y(x), mirror_y(o))), (base_t | 3, (mirror_y(mx), mirror_y(mo)))):
+            if candidate < best:
+                best = candidate
+                best_t = t
+    return best[0], best[1], best_t
+
+
+def canonical_hash(x_bits, o_bits):
+    # Returns a 64-bit key that is the same for every symmetric copy of the position, and the symmetry to it.
+    x, o, t = canonical_bitboards(x_bits, o_bits)
+    return _fold(o, _fold(x)), t
+
+
+def canonical_hash_of_list(board):
+    # canonical_hash for a board kept as a list of columns of 'X', 'O' and ' ', of any size.
+    size = len(board)
+    x_bits = o_bits = 0
+    for x in range(size):
+        for y in range(size):
+            if board[x][y] == 'X':
+                x_bits |= 1 << (x * size + y)
+            elif board[x][y] == 'O':
+                o_bits |= 1 << (x * size + y)
+    return canonical_hash_of_bits(x_bits, o_bits, size)
+
+
+def canonical_hash_of_bits(x_bits, o_bits, size):
+    # canonical_hash for bitboards of any size, square (x, y) on bit x * size + y.
+    if size == SIZE:
+        return canonical_hash(x_bits, o_bits)
+    best = None
+    best_t = 0
+    for t, permutation in enumerate(_permutations(size)):
+        candidate = (_permute(x_bits, permutation), _permute(o_bits, permutation))
+        if best is None or candidate < best:
+            best = candidate
+            best_t = t
+    return _fold(best[1], _fold(best[0])), best_t
+
+
+_square_permutations = {}
+
+
+def _permutations(size):
+    # For each symmetry, the bit every square's bit moves to, built on first use per size.
+    permutations = _square_permutations.get(size)
+    if permutations is None:
+        permutations = []
+        for t in range(8):
+            permutation = []
+            for x in range(size):
+                for y in range(size):
+                    tx, ty = transform(t, x, y, size)
+                    permutation.append(tx * size + ty)
+            permutations.append(permutation)
+        _square_permutations[size] = permutations
+    return permutations
+
+
+def _permute(bits, permutation):
+    moved = 0
+    while bits:
+        low = bits & -bits
+        moved |= 1 << permutation[low.bit_length() - 1]
+        bits ^= low
+    return moved
+
+
+def _fold(bits, h=0):
+    # Hashes a bitboard of any size 64 bits at a time.
+    while True:
+        h = _mix(h ^ bits & _MASK64)
+        bits >>= 64
+        if not bits:
+            return h
+
+
+def _mix(h):
+    # splitmix64 finalizer: a bijection on 64-bit integers that spreads every input bit over the low bits
+    h = (h ^ (h >> 30)) * 0xBF58476D1CE4E5B9 & _MASK64
+    h = (h ^ (h >> 27)) * 0x94D049BB133111EB & _MASK64
+    return h ^ (h >> 31)
@@ -0,0 +1,48 @@
+# Pondering is switched off in pool workers, whose games already keep every CPU busy.
+#
+#   python -m pytest test_ponder.py    (from the repository root, where the players find their tables)
+from concurrent.futures import ProcessPoolExecutor
+from reversi_bitboard import BitReversiBoard
+from reversi_players import RandomComputerPlayer
+from tournament import play_games
+from player1.all_players import get_timed_player
+from player1.ponder import Ponderer, disable_pondering
+
+
+def _ponder_started():
+    # Builds a pondering player, plays its first move and reports whether a pondering process started.
+    player = get_timed_player('X', time_limit=0.05, ponder=True)
+    board = BitReversiBoard()
+    board.make_move('X', player.get_move(board.copy()))
+    player.ponder(board)
+    started = player.ponderer._process is not None
+    player.close()
+    return started
+
+
+class _CheckedPonderer(Ponderer):
+
+    def start(self, board):
+        super().start(board)
+        if self._process is not None:
+            raise AssertionError("a pool worker started pondering")
+
+
+def _checked_player(symbol):
+    player = get_timed_player(symbol, time_limit=0.05, ponder=True)
+    player.ponderer = _CheckedPonderer(player)
+    return player
+
+
+def test_player_ponders_in_its_own_process():
+    assert _ponder_started()
+
+
+def test_player_in_pool_worker_does_not_ponder():
+    with ProcessPoolExecutor(max_workers=1, initializer=disable_pondering) as pool:
+        assert not pool.submit(_ponder_started).result()
+
+
+def test_tournament_workers_do_not_ponder():
+    results = list(play_games(_checked_player, RandomComputerPlayer, 2, workers=2))
+    assert len(results) == 2
@@ -0,0 +1,222 @@
+# Runs many games between players, spread over a process pool.
+#
+# Players are given as factories: callables taking a symbol and returning a player, e.g.
+# player1.all_players.get_combined_player or a functools.partial of it. Factories have to be picklable
+# (module level functions or partials of them) when more than one worker is used.
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from os import cpu_count
+from reversi_bitboard import BitReversiBoard
+from reversi_game import ReversiGame
+from game_records import GameRecordWriter
+from player1.ponder import disable_pondering
+from player1.search_stats import COUNTERS, TIMES, read_trace
+
+# Players built inside a worker process, reused for every game that process plays.
+_worker_players = {}
+
+
+def factory_name(factory):
+    if isinstance(factory, partial):
+        args = [repr(a) for a in factory.args] + [k + "=" + repr(v) for k, v in factory.keywords.items()]
+        return factory_name(factory.func) + "(" + ", ".join(args) + ")"
+    return getattr(factory, '__name__', repr(factory))
+
+
+def play_games(factory1, factory2, games, workers=1, board_class=BitReversiBoard, names=None, trace=None,
+               record=None):
+    '''
+    Plays games between two players, alternating who moves first like compare_players does
+    :param factory1: builds the X player
+    :param factory2: builds the O player
+    :param games: number of games to play
+    :param workers: number of processes to play on, 1 plays in this process; players in worker processes don't
+    ponder, the games keep every worker busy already
+    :param names: optional names for the two players in the results, derived from the factories by default
+    :param trace: optional path of a JSON-lines file the players append their search statistics to
+    :param record: optional path of a game record file every finished game is appended to (see game_records.py)
+    :return: a generator of per-game results, in the order the games finish
+    '''
+    if record is None:
+        return _play_games(factory1, factory2, games, workers, board_class, names, trace)
+    return _recorded(_play_games(factory1, factory2, games, workers, board_class, names, trace), record,
+                     board_class().get_size())
+
+
+def _play_games(factory1, factory2, games, workers, board_class, names, trace):
+    if names is None:
+        names = (factory_name(factory1), factory_name(factory2))
+        if names[0] == names[1]:
+            names = (names[0] + " X", names[1] + " O")
+    if workers <= 1:
+        players = (factory1('X'), factory2('O'))
+        for player, name in zip(players, names):
+            _set_trace(player, trace, name)
+        for i in range(games):
+            yield _play_game(i, players, names, board_class)
+        _close_players(players)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=disable_pondering) as pool:
+        futures = [pool.submit(_play_game_in_worker, i, factory1, factory2, names, board_class, trace)
+                   for i in range(games)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def _recorded(results, path, size):
+    # Passes results on, appending each game to the game record file at path first.
+    with GameRecordWriter(path, size) as writer:
+        for result in results:
+            writer.write(result['record'])
+            yield result
+
+
+def run_tournament(factories, games, workers=1, board_class=BitReversiBoard, on_result=None, trace=None,
+                   record=None):
+    '''
+    Plays every pair of factories against each other
+    :param factories: list of player factories
+    :param games: number of games per pairing
+    :param workers: number of processes to play on
+    :param on_result: optional callback, called with each game's result as it finishes
+    :param trace: optional path of a JSON-lines search trace, see summarize_trace
+    :param record: optional path of a game record file to append every game to
+    :return: one summary per pairing, see summarize
+    '''
+    summaries = []
+    for i in range(len(factories)):
+        for j in range(i + 1, len(factories)):
+            results = []
+            for result in play_games(factories[i], factories[j], games, workers, board_class, trace=trace,
+                                     record=record):
+                if on_result is not None:
+                    on_result(result)
+                results.append(result)
+            summaries.append(summarize(results))
+    return summaries
+
+
+def summarize(results):
+    # Aggregates the results of one pairing into win counts, average scores and decision times.
+    names = list(results[0]['scores'])
+    summary = {'games': len(results),
+               'wins': {names[0]: 0, names[1]: 0, 'TIE': 0},
+               'average_scores': {name: 0 for name in names},
+               'average_decision_time': {name: 0 for name in names},
+               'max_decision_time': {name: 0 for name in names}}
+    total_time = {name: 0 for name in names}
+    total_moves = {name: 0 for name in names}
+    for result in results:
+        summary['wins'][result['winner']] += 1
+        for name in names:
+            summary['average_scores'][name] += result['scores'][name] / len(results)
+            total_time[name] += result['decision_time'][name]
+            total_moves[name] += result['moves'][name]
+            summary['max_decision_time'][name] = max(summary['max_decision_time'][name], result['max_decision_time'][name])
+    for name in names:
+        if total_moves[name]:
+            summary['average_decision_time'][name] = total_time[name] / total_moves[name]
+    return summary
+
+
+def print_summary(summary):
+    print(summary['wins'])
+    print(summary['average_scores'])
+    for name, t in summary['average_decision_time'].items():
+        print(name + " average decision time: ", t)
+    print("Highest Decision Times: ", summary['max_decision_time'])
+
+
+def summarize_trace(path):
+    '''
+    Aggregates the search statistics players wrote to a trace file
+    :param path: the trace given to play_games or run_tournament
+    :return: a dict from player name to its move count, totals of every counter and time, average depth,
+    average effective branching factor and TT hit rate, and how many moves came from the book, the endgame solver
+    and pondering
+    '''
+    totals = {}
+    for record in read_trace(path):
+        total = totals.get(record['label'])
+        if total is None:
+            total = totals[record['label']] = dict({name: 0 for name in COUNTERS + TIMES}, moves=0, depth=0,
+                                                   branching_factor=0, elapsed=0, book=0, endgame=0, ponder=0)
+        total['moves'] += 1
+        for name in COUNTERS + TIMES + ['depth', 'elapsed']:
+            total[name] += record[name]
+        total['branching_factor'] += record['effective_branching_factor']
+        if record['source'] != 'search':
+            total[record['source']] += 1
+    summary = {}
+    for label, total in totals.items():
+        searched = total['moves'] - total['book'] - total['endgame'] - total['ponder']
+        summary[label] = dict(total, depth=total['depth'] / total['moves'],
+                              branching_factor=total['branching_factor'] / searched if searched else 0,
+                              tt_hit_rate=total['tt_hits'] / total['tt_probes'] if total['tt_probes'] else 0)
+    return summary
+
+
+def print_trace_summary(summary):
+    for label, total in summary.items():
+        print(label + ":", total['moves'], "moves,", total['book'], "from the book,", total['endgame'], "solved,",
+              total['ponder'], "pondered")
+        print("  nodes:", total['nodes'], "leaves:", total['leaves'], "average depth: %.1f" % total['depth'],
+              "branching factor: %.2f" % total['branching_factor'])
+        print("  TT probes:", total['tt_probes'], "hit rate: %.2f" % total['tt_hit_rate'], "cutoffs:", total['tt_cutoffs'],
+              "beam pruned:", total['beam_pruned'], "of", total['beam_calls'], "nodes")
+        print("  time: %.2fs, move generation %.2fs, evaluation %.2fs, copying %.2fs" % (
+            total['elapsed'], total['move_generation_time'], total['evaluation_time'], total['copy_time']))
+
+
+def _set_trace(player, trace, name):
+    # Players that keep search statistics write them to the trace under their name in the results.
+    if trace is not None and hasattr(player, 'trace'):
+        player.trace = trace
+        player.trace_label = name
+
+
+def _play_game(index, players, names, board_class):
+    # Even games are started by the first player, odd games by the second.
+    by_symbol = {players[0].symbol: names[0], players[1].symbol: names[1]}
+    if index % 2 == 0:
+        game = ReversiGame(players[0], players[1], show_status=False, board_class=board_class)
+    else:
+        game = ReversiGame(players[1], players[0], show_status=False, board_class=board_class)
+    scores = game.board.calc_scores()
+    winner = game.calc_winner()
+    return {'game': index,
+            'first': by_symbol[game.player1.symbol],
+            'winner': winner if winner == 'TIE' else by_symbol[winner],
+            'scores': {by_symbol[s]: scores[s] for s in by_symbol},
+            'moves': {by_symbol[s]: game.moves_made[s] for s in by_symbol},
+            'decision_time': {by_symbol[s]: game.decision_times[s] for s in by_symbol},
+            'max_decision_time': {by_symbol[s]: game.max_decision_time[s] for s in by_symbol},
+            'record': game.get_record()}
+
+
+def _play_game_in_worker(index, factory1, factory2, names, board_class, trace=None):
+    players = []
+    for factory, name, symbol in ((factory1, names[0], 'X'), (factory2, names[1], 'O')):
+        if (name, symbol) not in _worker_players:
+            _worker_players[(name, symbol)] = factory(symbol)
+            _set_trace(_worker_players[(name, symbol)], trace, name)
+        players.append(_worker_players[(name, symbol)])
+    return _play_game(index, players, names, board_class)
+
+
+def _close_players(players):
+    for player in players:
+        if hasattr(player, 'close'):
+            player.close()
+
+
+def main():
+    from player1.all_players import get_combined_player, get_player_a
+    summaries = run_tournament([partial(get_combined_player, depth=5), get_player_a], 100, workers=cpu_count(),
+                               on_result=lambda result: print("game", result['game'], "winner:", result['winner']))
+    for summary in summaries:
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()